@@ -0,0 +1,116 @@
+'''Compare iterative expression parser with the previous recursive one.
+
+    python -m benchmarks.bench_expression
+'''
+import sys
+import timeit
+
+from mql.common import ast
+from mql.common.errors import MqlSyntaxError
+from mql.parser.lexer import Tokens
+from mql.parser.parser import (Parser, create_binary_expression,
+                               get_operator_precedence, parse_expression,
+                               parse_value)
+
+
+def legacy_parse_expression(parser):
+    left = legacy_parse_expression_token(parser)
+    if not left:
+        raise MqlSyntaxError('Empty expression', parser.source)
+    if not parser.match_type(Tokens.EXPRESSION) and \
+            not parser.match_keyword('AND') and \
+            not parser.match_keyword('OR'):
+        return left
+    operator = parser.next()
+    right = legacy_parse_expression_token_right(parser)
+    stack = [left, operator, right]
+
+    while parser.match_type(Tokens.EXPRESSION) or \
+            parser.match_keyword('AND') or parser.match_keyword('OR'):
+        operator = parser.next()
+        precedence = get_operator_precedence(operator)
+        while len(stack) > 2 and \
+                precedence <= get_operator_precedence(stack[-2]):
+            right = stack.pop()
+            op = stack.pop()
+            left = stack.pop()
+            stack.append(create_binary_expression(op.value, left, right))
+        node = legacy_parse_expression_token_right(parser)
+        stack.append(operator)
+        stack.append(node)
+    i = len(stack) - 1
+    node = stack[i]
+    while i > 1:  # roll up
+        operator = stack[i - 1]
+        left = stack[i - 2]
+        node = create_binary_expression(operator.value, left, node)
+        i -= 2
+    return node
+
+
+def legacy_parse_expression_token(parser):
+    if parser.match_type(Tokens.PAREN_LEFT):
+        return legacy_parse_expression_group(parser)
+    if parser.match_type(Tokens.IDENTIFIER):
+        return ast.Identifier(parser.next().value)
+
+
+def legacy_parse_expression_token_right(parser):
+    if parser.match_type(Tokens.PAREN_LEFT):
+        return legacy_parse_expression_group(parser)
+    value = parse_value(parser)
+    if value:
+        return value
+    if parser.match_type(Tokens.IDENTIFIER):
+        return ast.Identifier(parser.next().value)
+    if parser.match_keyword('NOT'):
+        parser.next()
+        return ast.UnaryExpression(legacy_parse_expression_token(parser))
+    raise MqlSyntaxError('Not found right expression', parser.source)
+
+
+def legacy_parse_expression_group(parser):
+    parser.expect_type(Tokens.PAREN_LEFT)
+    node = legacy_parse_expression(parser)
+    parser.expect_type(Tokens.PAREN_RIGHT)
+    return node
+
+
+def flat(size):
+    return ' AND '.join('(a{0} = ? OR b{0} > {0})'.format(i)
+                        for i in range(size))
+
+
+def nested(depth):
+    '''(a0=? OR (a1=? AND (a2=? OR ...)))'''
+    expr = 'z = ?'
+    for i in reversed(range(depth)):
+        op = 'OR' if i % 2 else 'AND'
+        expr = '(a{} = ? {} {})'.format(i, op, expr)
+    return expr
+
+
+def bench(name, source, number):
+    results = []
+    for parse in (legacy_parse_expression, parse_expression):
+        try:
+            seconds = timeit.timeit(
+                lambda: parse(Parser(source)), number=number)
+            results.append('{:10.2f}ms'.format(seconds / number * 1000))
+        except RecursionError:
+            results.append('{:>12}'.format('RecursionError'))
+    print('{:<24}{}{}'.format(name, *results))
+
+
+def main():
+    print('{:<24}{:>12}{:>12}'.format('expression', 'recursive', 'iterative'))
+    bench('flat 10', flat(10), 2000)
+    bench('flat 1000', flat(1000), 20)
+    for depth in (10, 100, 300):
+        bench('nested {}'.format(depth), nested(depth), 200)
+    depth = sys.getrecursionlimit() * 2
+    bench('nested {}'.format(depth), nested(depth), 5)
+
+
+if __name__ == '__main__':
+    main()
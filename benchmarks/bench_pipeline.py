@@ -0,0 +1,49 @@
+'''Compare separate transform, validate and generate passes with the
+fused pipeline.
+
+    python -m benchmarks.bench_pipeline
+'''
+import timeit
+
+from mql.common import schema
+from mql.common.source import Source
+from mql.execution.psql import PgsqlEngine
+from mql.mql import Mql
+
+
+class Connection:
+    placeholder = 'number'
+
+
+def select(columns, conditions):
+    results = ', '.join('c{}'.format(i) for i in range(columns))
+    where = ' AND '.join('c{} = {}'.format(i, i) for i in range(conditions))
+    return 'SELECT {} FROM foo WHERE {} ORDER BY c0 LIMIT 10'.format(
+        results, where)
+
+
+def create_mql(pipeline):
+    engine = PgsqlEngine(Connection(), cache_size=0)
+    source = Source('default', engine, schema.SourceSchema('default'))
+    return Mql([source], cache_size=0, validation_cache_size=0,
+               parametrize=True, pipeline=pipeline)
+
+
+def bench(name, query, number):
+    results = []
+    for pipeline in (False, True):
+        mql = create_mql(pipeline)
+        seconds = timeit.timeit(lambda: mql.prepare(query), number=number)
+        results.append('{:10.3f}ms'.format(seconds / number * 1000))
+    print('{:<24}{}{}'.format(name, *results))
+
+
+def main():
+    print('{:<24}{:>12}{:>12}'.format('query', 'passes', 'pipeline'))
+    bench('select 5/5', select(5, 5), 2000)
+    bench('select 20/50', select(20, 50), 300)
+    bench('select 100/300', select(100, 300), 50)
+
+
+if __name__ == '__main__':
+    main()
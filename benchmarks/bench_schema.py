@@ -0,0 +1,177 @@
+'''Build schema from a synthetic catalog with the previous list scanning
+builder and the indexed one.
+
+    python -m benchmarks.bench_schema
+'''
+import time
+import tracemalloc
+
+from mql.common import schema
+from mql.execution.psql.schema import (AttrNode, Builder, ClassNode,
+                                       ConstraintNode, EnumNode,
+                                       NamespaceNode, StreamBuilder, TypeNode)
+
+
+class LegacyBuilder(Builder):
+    '''Builder before catalog indexes, every lookup scans a list.'''
+
+    def __init__(self):
+        self.nss = []
+        self.types = []
+        self.classes = []
+        self.attrs = []
+        self.constraints = []
+        self.enums = []
+        # catalog has no index and stat rows, see Builder.get_columns
+        self.indexes = {}
+        self.stats = {}
+
+    def is_primary_key(self, attr):
+        for constraint in self.constraints:
+            if constraint.is_primary_key and \
+                    constraint.class_id == attr.class_id:
+                if attr.num in constraint.refs:
+                    return True
+        return False
+
+    def add_namespace(self, data):
+        self.nss.append(NamespaceNode(data))
+
+    def add_type(self, data):
+        self.types.append(TypeNode(data))
+
+    def add_enum(self, data):
+        type_id = data['type_id']
+        for node in self.enums:
+            if node.id == type_id:
+                node.add_label(data['label'])
+                return
+        self.enums.append(EnumNode(data))
+
+    def add_constraint(self, data):
+        self.constraints.append(ConstraintNode(data))
+
+    def add_class(self, data):
+        node = ClassNode(data)
+        node.type = self.find_type(data)
+        node.namespace = self.find_namespace(data)
+        self.classes.append(node)
+
+    def add_attribute(self, data):
+        node = AttrNode(data)
+        node.type = self.find_type(data)
+        node.enum = self.find_enum(data)
+        node.is_primary = self.is_primary_key(node)
+        self.attrs.append(node)
+
+    def find_namespace(self, data):
+        return self._scan(self.nss, data['namespace_id'])
+
+    def find_type(self, data):
+        return self._scan(self.types, data['type_id'])
+
+    def find_enum(self, data):
+        return self._scan(self.enums, data['type_id'])
+
+    def find_class(self, data):
+        return self._scan(self.classes, data['class_id'])
+
+    def _scan(self, nodes, node_id):
+        for node in nodes:
+            if node.id == node_id:
+                return node
+
+    def get_tables(self):
+        for clazz in self.classes:
+            name = '{}.{}'.format(clazz.namespace.name, clazz.name)
+            table = schema.Table(name, clazz.kind)
+            for column in self.get_columns(clazz.id):
+                table.add_column(column)
+            yield table
+
+    def get_attrs(self, class_id):
+        for attr in self.attrs:
+            if attr.class_id == class_id:
+                yield attr
+
+
+def catalog(classes, attrs_per_class):
+    yield {'type': 'namespace', 'id': 1, 'name': 'public'}
+    for type_id in (23, 1043):
+        yield {'type': 'type', 'id': type_id, 'kind': 'b',
+               'name': 'int4' if type_id == 23 else 'varchar'}
+    for class_id in range(1000, 1000 + classes):
+        yield {'type': 'type', 'id': class_id + 500000, 'kind': 'c',
+               'name': 't{}'.format(class_id)}
+    for class_id in range(1000, 1000 + classes):
+        yield {'type': 'constraint', 'name': 'pk{}'.format(class_id),
+               'kind': 'p', 'class_id': class_id, 'fclass_id': None,
+               'conkey': [1], 'confkey': None}
+    for class_id in range(1000, 1000 + classes):
+        yield {'type': 'class', 'id': class_id, 'name': 't{}'.format(class_id),
+               'namespace_id': 1, 'type_id': class_id + 500000, 'kind': 'r'}
+    for class_id in range(1000, 1000 + classes):
+        for num in range(1, attrs_per_class + 1):
+            yield {'type': 'attribute', 'class_id': class_id, 'num': num,
+                   'name': 'c{}'.format(num), 'type_id': 23, 'notnull': True,
+                   'hasdefault': False, 'stype': 'integer', 'svalue': None}
+
+
+def bench(name, builder_class, rows):
+    start = time.perf_counter()
+    builder = builder_class()
+    for row in rows:
+        builder.add(row)
+    builder.get_schema('default')
+    return time.perf_counter() - start
+
+
+def main():
+    print('{:<28}{:>12}{:>12}'.format('catalog', 'legacy', 'indexed'))
+    for classes, attrs in ((100, 10), (500, 20), (1000, 25)):
+        rows = list(catalog(classes, attrs))
+        results = [
+            '{:10.3f}s'.format(bench(name, builder_class, rows))
+            for name, builder_class in (
+                ('legacy', LegacyBuilder), ('indexed', Builder))
+        ]
+        name = '{} classes/{} attrs'.format(classes, classes * attrs)
+        print('{:<28}{}{}'.format(name, *results))
+    rows = list(catalog(8000, 25))
+    print('{:<28}{:>12}{:10.3f}s'.format(
+        '8000 classes/200000 attrs', '-', bench('indexed', Builder, rows)))
+    print()
+    print('{:<28}{:>12}{:>12}'.format('peak memory', 'fetchall', 'stream'))
+    results = [
+        '{:10.1f}MB'.format(peak_memory(builder_class, 2000, 25) / 2 ** 20)
+        for builder_class in (Builder, StreamBuilder)
+    ]
+    print('{:<28}{}{}'.format('2000 classes/50000 attrs', *results))
+
+
+def peak_memory(builder_class, classes, attrs):
+    '''Peak memory of loading rows, all at once for Builder and in chunks
+    of 1000 rows for StreamBuilder.'''
+    tracemalloc.start()
+    builder = builder_class()
+    if builder_class is StreamBuilder:
+        chunk = []
+        for row in catalog(classes, attrs):
+            chunk.append(row)
+            if len(chunk) == 1000:
+                for item in chunk:
+                    builder.add(item)
+                chunk = []
+        for item in chunk:
+            builder.add(item)
+    else:
+        for row in list(catalog(classes, attrs)):
+            builder.add(row)
+    builder.get_schema('default')
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,44 @@
+_FIELDS = {}
+
+
+def node_fields(node_class):
+    '''Return names of public fields of node class, computed once.'''
+    try:
+        return _FIELDS[node_class]
+    except KeyError:
+        slots = node_class.__slots__
+        if isinstance(slots, str):
+            slots = (slots, )
+        fields = tuple(name for name in slots if not name.startswith('_'))
+        _FIELDS[node_class] = fields
+        return fields
+
+
 class Node:
-    __slots__ = ()
+    '''Base of syntax tree nodes.
+
+    Nodes compare and hash by structure. The hash is computed on first use
+    and kept on the node, so a node must not be changed after it has been
+    hashed (see CopyOnWriteTransformer).
+    '''
+
+    __slots__ = ('_hash', '_shape_hash', '_literal_hash')
+
+    # values of bind parameters are skipped by shape comparison
+    _parameter = False
+    # values of literals and bind parameters are skipped with literals=False
+    _literal = False
+
+    def __eq__(self, other):
+        if not isinstance(other, Node):
+            return NotImplemented
+        return structurally_equal(self, other)
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            return structural_hash(self)
 
 
 class Expresion(Node):
@@ -22,6 +61,18 @@ class Placeholder(Node):
         return '<Placeholder>'
 
 
+class Parameter(Placeholder):  # literal lifted into bind parameter
+    __slots__ = ('value', )
+    _parameter = True
+    _literal = True
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return '<Parameter value={}>'.format(self.value)
+
+
 class BinaryExpression(Expresion):  # ==, >=, <=, !=
     __slots__ = ('operator', 'left', 'right')
 
@@ -64,7 +115,7 @@ class UnaryExpression(Expresion):  # not
 
 
 class InExpression(Expresion):  # and, or
-    __slots__ = ('items')
+    __slots__ = ('items', )
 
     def __init__(self, items):
         self.items = items
@@ -75,6 +126,7 @@ class InExpression(Expresion):  # and, or
 
 class _Value(Node):
     __slots__ = ('value', )
+    _literal = True
 
     def __init__(self, value):
         self.value = value
@@ -335,14 +387,21 @@ class ShowSourcesStatement(_ShowStatement):
 
 
 class ShowSourceStatement(_ShowStatement):
-    __slots__ = ('source', )
+    __slots__ = ('source', 'pattern', 'limit', 'offset')
 
-    def __init__(self, source):
+    def __init__(self, source, pattern=None, limit=None, offset=None):
         self.source = source
+        self.pattern = pattern
+        self.limit = limit
+        self.offset = offset
 
     def __repr__(self):
-        return '<ShowTableStatement source={}>'.format(
-            repr(self.source)
+        return '<ShowTableStatement source={} pattern={} limit={} ' \
+            'offset={}>'.format(
+            repr(self.source),
+            repr(self.pattern),
+            self.limit,
+            self.offset
         )
 
 
@@ -366,3 +425,130 @@ def is_show_statement(node):
 
 def is_show_sources_statement(node):
     return isinstance(node, ShowSourcesStatement)
+
+
+class ShapeKey:
+    '''Hashable key of node shape, values of bind parameters are ignored.
+
+    Literals are part of generated SQL and so of the shape, documents which
+    differ only in parameter values (see LiteralTransformer) share the key.
+    '''
+
+    __slots__ = ('node', '_hash')
+
+    def __init__(self, node):
+        self.node = node
+        self._hash = structural_hash(node, parameters=False)
+
+    def __eq__(self, other):
+        if not isinstance(other, ShapeKey):
+            return NotImplemented
+        return self._hash == other._hash and \
+            structurally_equal(self.node, other.node, parameters=False)
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return '<ShapeKey {}>'.format(repr(self.node))
+
+
+def _skipped_values(parameters, literals):
+    '''Return hash slot and flag of nodes whose values are left out.'''
+    if not literals:
+        return '_literal_hash', '_literal'
+    if not parameters:
+        return '_shape_hash', '_parameter'
+    return '_hash', None
+
+
+def structural_hash(node, parameters=True, literals=True):
+    '''Return hash of node structure, cached on every visited node.
+
+    With parameters=False values of bind parameters are left out, with
+    literals=False values of literals and bind parameters are.
+    '''
+    slot, skip = _skipped_values(parameters, literals)
+    try:
+        return getattr(node, slot)
+    except AttributeError:
+        pass
+    stack = [node]
+    while stack:
+        current = stack[-1]
+        if hasattr(current, slot):
+            stack.pop()
+            continue
+        node_class = current.__class__
+        fields = () if skip and getattr(current, skip) \
+            else node_fields(node_class)
+        pending = [
+            child for child in _iter_nodes(current, fields)
+            if not hasattr(child, slot)
+        ]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        values = [node_class]
+        for name in fields:
+            value = getattr(current, name)
+            if isinstance(value, list):
+                value = tuple(
+                    getattr(item, slot) if isinstance(item, Node) else item
+                    for item in value
+                )
+            elif isinstance(value, Node):
+                value = getattr(value, slot)
+            values.append(value)
+        setattr(current, slot, hash(tuple(values)))
+    return getattr(node, slot)
+
+
+def structurally_equal(left, right, parameters=True, literals=True):
+    '''Compare node trees by structure.
+
+    With parameters=False values of bind parameters are not compared, with
+    literals=False values of literals and bind parameters are not.
+    '''
+    skip = _skipped_values(parameters, literals)[1]
+    stack = [(left, right)]
+    while stack:
+        left, right = stack.pop()
+        if left is right:
+            continue
+        node_class = left.__class__
+        if node_class is not right.__class__ or \
+                structural_hash(left, parameters, literals) != \
+                structural_hash(right, parameters, literals):
+            return False
+        if skip and getattr(left, skip):
+            continue
+        for name in node_fields(node_class):
+            left_value = getattr(left, name)
+            right_value = getattr(right, name)
+            if isinstance(left_value, list):
+                if not isinstance(right_value, list) or \
+                        len(left_value) != len(right_value):
+                    return False
+                pairs = zip(left_value, right_value)
+            else:
+                pairs = ((left_value, right_value), )
+            for left_item, right_item in pairs:
+                if isinstance(left_item, Node) and \
+                        isinstance(right_item, Node):
+                    stack.append((left_item, right_item))
+                elif left_item != right_item:
+                    return False
+    return True
+
+
+def _iter_nodes(node, fields):
+    for name in fields:
+        value = getattr(node, name)
+        if isinstance(value, list):
+            for item in value:
+                if isinstance(item, Node):
+                    yield item
+        elif isinstance(value, Node):
+            yield value
@@ -0,0 +1,71 @@
+import collections
+
+__all__ = ['CacheInfo', 'LRUCache']
+
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'evictions', 'size', 'maxsize']
+)
+
+
+class LRUCache:
+    '''Bounded mapping which drops the least recently used entry first.
+
+    A ``maxsize`` of zero (or ``None``) disables caching, every lookup
+    is then counted as a miss.
+    '''
+
+    __slots__ = ('maxsize', 'hits', 'misses', 'evictions', '_data')
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize or 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        data = self._data
+        data[key] = value
+        data.move_to_end(key)
+        if len(data) > self.maxsize:
+            data.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def prune(self, predicate):
+        '''Drop entries for which predicate(key, value) is true.'''
+        data = self._data
+        keys = [key for key, value in data.items() if predicate(key, value)]
+        for key in keys:
+            del data[key]
+        return len(keys)
+
+    def info(self):
+        return CacheInfo(
+            self.hits, self.misses, self.evictions,
+            len(self._data), self.maxsize
+        )
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
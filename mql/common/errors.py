@@ -23,6 +23,18 @@ class MqlSyntaxError(MqlError):
         self.position = position
 
 
+class MqlValidationError(MqlError):
+    __slots__ = ('errors', )
+
+    def __init__(self, errors):
+        super().__init__('; '.join(map(str, errors)))
+        self.errors = errors
+
+
+class MqlSnapshotError(MqlError):
+    pass
+
+
 def format_error(error, short=True):
     if isinstance(error, MqlSyntaxError):
         if short:
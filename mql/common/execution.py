@@ -34,3 +34,36 @@ class ExecutionContext:
         )
         logger.error(''.join(exception))
         self.errors.append(error)
+
+
+class PreparedQuery:
+    '''Parsed, transformed and validated query ready to execute.
+
+    When the source compiled the document into a statement, execution goes
+    straight to it, otherwise the source executes the document.
+    '''
+
+    __slots__ = ('query', 'ast_document', 'source', 'sources', 'statement',
+                 'binder')
+
+    def __init__(self, sources, source, ast_document, query, statement=None,
+                 binder=None):
+        self.sources = sources
+        self.source = source
+        self.ast_document = ast_document
+        self.query = query
+        self.statement = statement
+        self.binder = binder
+
+    async def execute(self, params=None):
+        try:
+            if self.binder:
+                params = self.binder.bind(params)
+            if self.statement is not None:
+                return await self.statement.execute(params)
+            context = ExecutionContext(
+                self.sources, self.ast_document, params, self.query
+            )
+            return await self.source.execute(context)
+        except Exception as ex:
+            return ExecuteResult(errors=[ex])
@@ -0,0 +1,114 @@
+import hashlib
+
+from . import ast
+from .errors import MqlError
+from .traverse import (CopyOnWriteTransformer, NodeWalker, node_fields,
+                       walk)
+
+__all__ = ['LiteralTransformer', 'ParamsBinder', 'fingerprint', 'shape',
+           'params_types']
+
+
+class LiteralTransformer(CopyOnWriteTransformer):
+    '''Replace literal values with bind parameters.
+
+    Queries which differ only in literal values share the same shape and
+    therefore the same generated SQL.
+    '''
+
+    def visit_IntNumber(self, node):
+        return ast.Parameter(node.value)
+
+    def visit_String(self, node):
+        return ast.Parameter(node.value)
+
+
+class _PlaceholdersWalker(NodeWalker):
+    def __init__(self):
+        self.placeholders = []
+
+    def visit_Placeholder(self, node, *args):
+        self.placeholders.append(node)
+
+    def visit_Parameter(self, node, *args):
+        self.placeholders.append(node)
+
+
+_ARG = object()
+
+
+class ParamsBinder:
+    '''Merge user params with lifted literals in placeholders order.'''
+
+    __slots__ = ('_slots', )
+
+    def __init__(self, ast_document=None, placeholders=None):
+        if placeholders is None:
+            walker = _PlaceholdersWalker()
+            walk(ast_document, walker)
+            placeholders = walker.placeholders
+        slots = [
+            node.value if isinstance(node, ast.Parameter) else _ARG
+            for node in placeholders
+        ]
+        self._slots = slots if any(s is not _ARG for s in slots) else None
+
+    def bind(self, params=None):
+        if self._slots is None:
+            return params
+        args = iter(params or ())
+        try:
+            return [next(args) if s is _ARG else s for s in self._slots]
+        except StopIteration:
+            raise MqlError('Missing query params') from None
+
+
+def fingerprint(ast_document):
+    '''Return stable digest of the document shape.
+
+    Values of bind parameters are not part of the shape. Unlike the shape
+    key the digest does not change between processes.
+    '''
+    digest = hashlib.sha1()
+    stack = [ast_document]
+    while stack:
+        node = stack.pop()
+        node_class = node.__class__
+        values = [node_class.__name__]
+        children = []
+        if not node._parameter:
+            for name in node_fields(node_class):
+                value = getattr(node, name)
+                if isinstance(value, ast.Node):
+                    children.append(value)
+                    value = _NODE
+                elif isinstance(value, list):
+                    children.extend(
+                        item for item in value if isinstance(item, ast.Node)
+                    )
+                    value = tuple(
+                        _NODE if isinstance(item, ast.Node) else item
+                        for item in value
+                    )
+                values.append(value)
+        digest.update(repr(values).encode('utf8'))
+        children.reverse()
+        stack.extend(children)
+    return digest.hexdigest()
+
+
+def shape(ast_document):
+    '''Return hashable key of the document shape, see ast.ShapeKey.'''
+    return ast.ShapeKey(ast_document)
+
+
+_NODE = '<node>'
+
+
+def params_types(params):
+    '''Return hashable types of params, part of cache keys.'''
+    if not params:
+        return ()
+    if isinstance(params, dict):
+        return tuple((name, type(value)) for name, value in params.items())
+    return tuple(type(value) for value in params)
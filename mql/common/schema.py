@@ -1,5 +1,19 @@
+import asyncio
+import collections
+import functools
+import itertools
+import json
+import re
+
+from . import ast
+from .views import ListView
+
+_versions = itertools.count(1)
+
 
 class Type:
+    __slots__ = ('_name', )
+
     def __init__(self, name):
         self._name = name
 
@@ -16,33 +30,211 @@ class Type:
 
 
 class SourceSchema(Type):
+    __slots__ = ('_version', '_tables', '_tables_view', '_tables_by_name',
+                 '_unqualified', '_serialized', '_json')
+
     def __init__(self, name):
         super().__init__(name)
+        self._version = next(_versions)
         self._tables = []
+        self._tables_view = ListView(self._tables)
+        self._tables_by_name = {}
+        # full names of tables by name without namespace
+        self._unqualified = {}
+        self._serialized = None
+        self._json = None
+
+    @property
+    def version(self):
+        '''Number unique to this schema instance, newer schemas get
+        higher numbers.'''
+        return self._version
 
     def add_table(self, table):
         self._tables.append(table)
+        if self._tables_by_name.setdefault(table.name, table) is table:
+            self._add_unqualified(table.name)
+        self._serialized = self._json = None
+
+    def _add_unqualified(self, name):
+        namespace, _, unqualified = name.rpartition('.')
+        if namespace:
+            names = self._unqualified.setdefault(unqualified, [])
+            if name not in names:
+                names.append(name)
 
     def match(self, ast_document):
         return self.name == ast_document.table.source
 
     @property
     def tables(self):
-        return self._tables[:]
+        return self._tables_view
+
+    @property
+    def table_names(self):
+        return [table.name for table in self._tables]
+
+    def get_table(self, name):
+        return self._tables_by_name.get(name)
+
+    def find_table(self, name):
+        '''Return table by name which may lack namespace, see
+        resolve_table_name.'''
+        name = self.resolve_table_name(name)
+        return None if name is None else self.get_table(name)
+
+    def resolve_table_name(self, name):
+        '''Return full name of table or None when it is unknown.
+
+        Names without namespace are looked up in the public namespace
+        first, then in the only namespace having them.
+        '''
+        if self._has_table_name(name):
+            return name
+        if '.' in name:
+            return None
+        public_name = 'public.' + name
+        if self._has_table_name(public_name):
+            return public_name
+        names = self._unqualified.get(name, ())
+        return names[0] if len(names) == 1 else None
+
+    def _has_table_name(self, name):
+        return name in self._tables_by_name
 
     def serialize(self):
-        return super().serialize(
-            tables=[table.serialize() for table in self._tables]
-        )
+        '''Return serialized schema, built once and shared, do not change
+        it.'''
+        if self._serialized is None:
+            self._serialized = super().serialize(
+                tables=self.serialize_tables()
+            )
+        return self._serialized
+
+    def to_json(self):
+        if self._json is None:
+            self._json = json.dumps(self.serialize(), separators=(',', ':'))
+        return self._json
+
+    def serialize_tables(self, pattern=None, limit=None, offset=None):
+        '''Serialize tables which names match LIKE pattern, one page.'''
+        names = self.table_names
+        if pattern is not None:
+            match = like_pattern(pattern)
+            names = [name for name in names if match(name)]
+        start = offset or 0
+        end = None if limit is None else start + limit
+        return [self._serialize_table(name) for name in names[start:end]]
+
+    def _serialize_table(self, name):
+        return self.get_table(name).serialize()
+
+
+class LazySourceSchema(SourceSchema):
+    '''Schema which knows only names of tables up front.
+
+    Tables are fetched with ``await loader(names)``, which returns the
+    tables, the first time a query refers to them (see load_tables) and
+    kept afterwards. Until then get_table returns None.
+    '''
+
+    __slots__ = ('_table_names', '_known', '_loader', '_pending', '_loads')
+
+    def __init__(self, name, table_names, loader):
+        super().__init__(name)
+        self._table_names = list(table_names)
+        self._known = set(self._table_names)
+        self._loader = loader
+        self._pending = {}
+        self._loads = 0
+        for name in self._table_names:
+            self._add_unqualified(name)
+
+    @property
+    def loads(self):
+        '''Number of completed table loads, changes whenever tables are
+        added.'''
+        return self._loads
+
+    @property
+    def table_names(self):
+        return self._table_names[:]
+
+    def missing_tables(self, ast_document):
+        '''Return full names of known tables used by document but not
+        loaded.'''
+        table = getattr(ast_document, 'table', None)
+        if not isinstance(table, ast.Table):
+            return []
+        name = self.resolve_table_name(table.name)
+        if name is not None and self.get_table(name) is None:
+            return [name]
+        return []
+
+    async def load_tables(self, names):
+        '''Load tables which are not loaded yet.
+
+        A table requested by concurrent callers is loaded only once.
+        '''
+        waiting = []
+        missing = []
+        for name in names:
+            if name not in self._known or self.get_table(name) is not None:
+                continue
+            future = self._pending.get(name)
+            if future is None:
+                missing.append(name)
+            elif future not in waiting:
+                waiting.append(future)
+        if missing:
+            future = asyncio.ensure_future(self._load(missing))
+            for name in missing:
+                self._pending[name] = future
+            waiting.append(future)
+        if waiting:
+            await asyncio.gather(*waiting)
+
+    def _has_table_name(self, name):
+        return name in self._known or name in self._tables_by_name
+
+    async def _load(self, names):
+        try:
+            for table in await self._loader(names):
+                if self.get_table(table.name) is None:
+                    self.add_table(table)
+            self._loads += 1
+        finally:
+            for name in names:
+                self._pending.pop(name, None)
+
+    def _serialize_table(self, name):
+        table = self.get_table(name)
+        if table is None:
+            return {'name': name}
+        return table.serialize()
 
 
 class Table(Type):
-    def __init__(self, name, kind=None, editable=True):
+    __slots__ = ('_kind', '_editable', '_columns', '_columns_view',
+                 '_columns_by_name', '_constraints', '_constraints_view',
+                 '_indexes', '_indexes_view', '_serialized', 'rows', 'pages')
+
+    def __init__(self, name, kind=None, editable=True, rows=None,
+                 pages=None):
         super().__init__(name)
         self._kind = kind
         self._editable = editable
+        # planner estimates, None when unknown
+        self.rows = rows
+        self.pages = pages
         self._columns = []
+        self._columns_view = ListView(self._columns)
+        self._columns_by_name = {}
         self._constraints = []
+        self._constraints_view = ListView(self._constraints)
+        self._indexes = []
+        self._indexes_view = ListView(self._indexes)
+        self._serialized = None
 
     @property
     def kind(self):
@@ -54,27 +246,65 @@ class Table(Type):
 
     @property
     def columns(self):
-        return list(self._columns)
+        return self._columns_view
 
     @property
     def constraints(self):
-        return list(self._constraints)
+        return self._constraints_view
+
+    @property
+    def indexes(self):
+        return self._indexes_view
+
+    def is_indexed(self, column_name):
+        '''Whether an index starts with column, so it can be searched.'''
+        for index in self._indexes:
+            if index.columns and index.columns[0] == column_name:
+                return True
+        return False
+
+    def is_unique(self, column_names):
+        '''Whether a unique index covers only given columns, so at most
+        one row has given values.'''
+        for index in self._indexes:
+            if (index.unique or index.primary) and index.columns and \
+                    None not in index.columns and \
+                    column_names.issuperset(index.columns):
+                return True
+        return False
+
+    def get_column(self, name):
+        return self._columns_by_name.get(name)
 
     def add_column(self, column):
         self._columns.append(column)
+        self._columns_by_name.setdefault(column.name, column)
+        self._serialized = None
 
     def add_constraint(self, constraint):
         self._constraints.append(constraint)
+        self._serialized = None
+
+    def add_index(self, index):
+        self._indexes.append(index)
+        self._serialized = None
 
     def serialize(self):
-        return super().serialize(
-            constraints=[constraint.serialize()
-                         for constraint in self._constraints],
-            columns=[column.serialize() for column in self._columns]
-        )
+        '''Serialize table structure, size and statistics are left out.'''
+        if self._serialized is None:
+            self._serialized = super().serialize(
+                constraints=[constraint.serialize()
+                             for constraint in self._constraints],
+                columns=[column.serialize() for column in self._columns],
+                indexes=[index.serialize() for index in self._indexes]
+            )
+        return self._serialized
 
 
 class Column(Type):
+    __slots__ = ('type', 'default_value', 'not_null', 'length', 'is_primary',
+                 'enum', 'stats')
+
     def __init__(self, name, type, default_value=None, not_null=False, is_primary=False, length=-1):
         super().__init__(name)
         self.type = type
@@ -83,6 +313,7 @@ class Column(Type):
         self.length = length
         self.is_primary = is_primary
         self.enum = []
+        self.stats = None
 
     def add_enum(self, value):
         self.enum.append(value)
@@ -96,3 +327,60 @@ class Column(Type):
             enum=self.enum[:],
             is_primary=self.is_primary
         )
+
+
+class Constraint(Type):
+    __slots__ = ('kind', 'columns', 'foreign_table', 'foreign_columns')
+
+    def __init__(self, name, kind, columns, foreign_table=None,
+                 foreign_columns=None):
+        super().__init__(name)
+        self.kind = kind
+        self.columns = columns
+        self.foreign_table = foreign_table
+        self.foreign_columns = foreign_columns
+
+    def serialize(self):
+        return super().serialize(
+            kind=self.kind,
+            columns=self.columns[:],
+            foreign_table=self.foreign_table,
+            foreign_columns=self.foreign_columns and self.foreign_columns[:]
+        )
+
+
+ColumnStats = collections.namedtuple(
+    'ColumnStats', ['null_frac', 'n_distinct', 'avg_width']
+)
+
+
+class Index(Type):
+    '''Index of table, None in columns stands for an expression.'''
+
+    __slots__ = ('columns', 'unique', 'primary', 'method')
+
+    def __init__(self, name, columns, unique=False, primary=False,
+                 method=None):
+        super().__init__(name)
+        self.columns = columns
+        self.unique = unique
+        self.primary = primary
+        self.method = method
+
+    def serialize(self):
+        return super().serialize(
+            columns=self.columns[:],
+            unique=self.unique,
+            primary=self.primary,
+            method=self.method
+        )
+
+
+@functools.lru_cache(maxsize=64)
+def like_pattern(pattern):
+    '''Return matcher of SQL LIKE pattern (% and _ wildcards).'''
+    regex = ''.join(
+        '.*' if char == '%' else '.' if char == '_' else re.escape(char)
+        for char in pattern
+    )
+    return re.compile(regex, re.DOTALL).fullmatch
@@ -0,0 +1,140 @@
+'''Compact, versioned file format of source schema.
+
+Tables, columns, constraints and indexes are stored as positional lists
+together with size and column statistics, so a snapshot can be loaded at
+startup without asking the database.
+'''
+import json
+import os
+
+from . import schema
+from .errors import MqlSnapshotError
+
+__all__ = ['VERSION', 'dumps', 'loads', 'save', 'load']
+
+VERSION = 2
+
+
+def dumps(source_schema):
+    data = {
+        'version': VERSION,
+        'name': source_schema.name,
+        'tables': [_dump_table(table) for table in source_schema.tables],
+    }
+    return json.dumps(data, separators=(',', ':'))
+
+
+def loads(text):
+    try:
+        data = json.loads(text)
+    except ValueError as ex:
+        raise MqlSnapshotError('Invalid schema snapshot: {}'.format(ex))
+    if not isinstance(data, dict) or data.get('version') != VERSION:
+        raise MqlSnapshotError('Unsupported schema snapshot version')
+    try:
+        source_schema = schema.SourceSchema(data['name'])
+        for table in data['tables']:
+            source_schema.add_table(_load_table(table))
+    except (KeyError, TypeError, ValueError) as ex:
+        raise MqlSnapshotError('Invalid schema snapshot: {}'.format(ex))
+    return source_schema
+
+
+def save(source_schema, path):
+    '''Write snapshot atomically, readers never see a partial file.
+
+    Raises MqlSnapshotError when the file can not be written, the
+    temporary file is removed then.
+    '''
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    text = dumps(source_schema)
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError as ex:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise MqlSnapshotError('Cannot write schema snapshot: {}'.format(ex))
+
+
+def load(path):
+    try:
+        with open(path) as f:
+            text = f.read()
+    except OSError as ex:
+        raise MqlSnapshotError('Cannot read schema snapshot: {}'.format(ex))
+    return loads(text)
+
+
+def _dump_table(table):
+    return [
+        table.name,
+        table.kind,
+        table.editable,
+        [_dump_column(column) for column in table.columns],
+        [_dump_constraint(constraint) for constraint in table.constraints],
+        [_dump_index(index) for index in table.indexes],
+        table.rows,
+        table.pages,
+    ]
+
+
+def _dump_column(column):
+    return [
+        column.name,
+        column.type,
+        column.default_value,
+        column.not_null,
+        column.is_primary,
+        column.length,
+        column.enum,
+        column.stats,
+    ]
+
+
+def _dump_constraint(constraint):
+    return [
+        constraint.name,
+        constraint.kind,
+        constraint.columns,
+        constraint.foreign_table,
+        constraint.foreign_columns,
+    ]
+
+
+def _dump_index(index):
+    return [
+        index.name,
+        index.columns,
+        index.unique,
+        index.primary,
+        index.method,
+    ]
+
+
+def _load_table(data):
+    name, kind, editable, columns, constraints, indexes, rows, pages = data
+    table = schema.Table(name, kind, editable, rows, pages)
+    for column in columns:
+        table.add_column(_load_column(column))
+    for constraint in constraints:
+        table.add_constraint(schema.Constraint(*constraint))
+    for index in indexes:
+        table.add_index(schema.Index(*index))
+    return table
+
+
+def _load_column(data):
+    (name, type_, default_value, not_null, is_primary, length, enum,
+     stats) = data
+    column = schema.Column(
+        name, type_, default_value, not_null, is_primary, length
+    )
+    for value in enum:
+        column.add_enum(value)
+    if stats is not None:
+        column.stats = schema.ColumnStats(*stats)
+    return column
@@ -1,25 +1,174 @@
+import asyncio
+import collections
+import logging
+import time
+
 from mql.common import errors, execution
 
+logger = logging.getLogger(__name__)
+
+SchemaLoad = collections.namedtuple(
+    'SchemaLoad', ['source', 'schema', 'seconds', 'error']
+)
+
 
 class Source:
     def __init__(self, name, executor, schema):
         self._name = name
         self._executor = executor
         self._schema = schema
+        self._listeners = []
 
     @property
     def name(self):
         return self._name
 
+    @property
+    def executor(self):
+        return self._executor
+
     @property
     def schema(self):
         return self._schema
 
+    def set_schema(self, schema):
+        '''Replace schema, requests in flight keep the one they started with.
+
+        The executor (schema_changed) and listeners are notified with the
+        new schema to drop anything derived from the old one.
+        '''
+        old_schema = self._schema
+        self._schema = schema
+        schema_changed = getattr(self._executor, 'schema_changed', None)
+        if schema_changed:
+            schema_changed(schema)
+        for listener in self._listeners:
+            listener(self, old_schema, schema)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
     def match(self, ast_document):
         return self._schema.match(ast_document)
 
+    def prepare(self, ast_document):
+        prepare = getattr(self._executor, 'prepare', None)
+        if prepare:
+            return prepare(ast_document)
+
     async def execute(self, context):
         try:
             return await self._executor.execute(context)
         except Exception as ex:
             return execution.ExecuteResult(errors=[ex])
+
+
+class SchemaManager:
+    '''Reload schema of source in background and swap it in atomically.
+
+    The new schema is built aside while requests keep using the current
+    one. By default it is loaded with executor.load_schema(name), a failed
+    reload keeps the current schema.
+    '''
+
+    def __init__(self, source, loader=None, ttl=None, clock=time.monotonic):
+        self._source = source
+        self._loader = loader or self._load
+        self._ttl = ttl
+        self._clock = clock
+        self._loaded_at = clock()
+        self._task = None
+        self._timer = None
+        self.last_error = None
+
+    @property
+    def source(self):
+        return self._source
+
+    def is_stale(self):
+        if self._ttl is None:
+            return False
+        return self._clock() - self._loaded_at >= self._ttl
+
+    def refresh(self):
+        '''Start reload unless one is running, return its task.
+
+        Await the task to wait for the new schema, it resolves to None when
+        the reload failed.
+        '''
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._refresh())
+        return self._task
+
+    def start(self):
+        '''Reload schema every ttl seconds.'''
+        if self._ttl is None:
+            raise errors.MqlError('Schema manager without ttl')
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def _run(self):
+        while True:
+            delay = self._ttl - (self._clock() - self._loaded_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.refresh()
+            if self.last_error is not None:
+                # do not retry a failing source in a busy loop
+                await asyncio.sleep(self._ttl)
+
+    async def _refresh(self):
+        try:
+            schema = await self._loader(self._source.schema.name)
+        except Exception as ex:
+            logger.exception('Reloading schema of "%s" failed',
+                             self._source.name)
+            self.last_error = ex
+            return None
+        self.last_error = None
+        self._loaded_at = self._clock()
+        self._source.set_schema(schema)
+        return schema
+
+    def _load(self, name):
+        return self._source.executor.load_schema(name)
+
+
+async def load_schemas(sources, concurrency=8, loader=None, timeout=None):
+    '''Load schemas of sources concurrently and swap them in.
+
+    At most concurrency schemas are loaded at once. A failing or timed out
+    source keeps its schema and does not stop the others. Returns one
+    SchemaLoad per source with the load time and error.
+    '''
+    semaphore = asyncio.Semaphore(concurrency)
+    loader = loader or _load_schema
+
+    async def load(source):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                schema = await asyncio.wait_for(loader(source), timeout)
+            except Exception as ex:
+                seconds = time.perf_counter() - start
+                logger.error('Loading schema of "%s" failed after %.3fs: %s',
+                             source.name, seconds, ex)
+                return SchemaLoad(source, None, seconds, ex)
+            seconds = time.perf_counter() - start
+            logger.info('Loaded schema of "%s" in %.3fs', source.name, seconds)
+            source.set_schema(schema)
+            return SchemaLoad(source, schema, seconds, None)
+
+    return await asyncio.gather(*(load(source) for source in sources))
+
+
+def _load_schema(source):
+    return source.executor.load_schema(source.schema.name)
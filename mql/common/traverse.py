@@ -1,34 +1,143 @@
 from . import ast
+from .ast import node_fields
+from .cache import LRUCache
+from .views import ListView
 
-__all__ = ['NodeVisitor', 'NodeTransformer',
-           'NodeWalker', 'NodeWalkers', 'walk']
+__all__ = ['NodeVisitor', 'IterativeVisitor', 'NodeTransformer',
+           'CopyOnWriteTransformer', 'NodeWalker', 'NodeWalkers', 'walk',
+           'node_fields', 'copy_node']
+
+# marks exhausted children of IterativeVisitor
+_DONE = object()
+
+
+def copy_node(node, **changes):
+    '''Return shallow copy of node with public fields replaced by changes.'''
+    node_class = node.__class__
+    new_node = node_class.__new__(node_class)
+    for field_name in node_fields(node_class):
+        if field_name in changes:
+            value = changes.pop(field_name)
+        else:
+            value = getattr(node, field_name)
+        setattr(new_node, field_name, value)
+    if changes:
+        raise AttributeError('{} has no fields: {}'.format(
+            node_class.__name__, ', '.join(changes)))
+    return new_node
 
 
 def iter_fields(node):
-    for field_name in node.__slots__:
+    for field_name in node_fields(node.__class__):
         yield field_name, getattr(node, field_name)
 
 
-class NodeVisitor:
+def iter_child_nodes(node):
+    for field_name in node_fields(node.__class__):
+        value = getattr(node, field_name)
+        if isinstance(value, list):
+            for item in value:
+                if isinstance(item, ast.Node):
+                    yield item
+        elif isinstance(value, ast.Node):
+            yield value
+
+
+class _Dispatcher:
+    '''Keeps per class table of visit_<NodeClass> handlers.'''
+
+    _handlers = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._handlers = {}
+
+    @classmethod
+    def _find_handler(cls, node_class, default=None):
+        handler = getattr(cls, 'visit_' + node_class.__name__, default)
+        cls._handlers[node_class] = handler
+        return handler
+
+
+class NodeVisitor(_Dispatcher):
     def visit(self, node):
         if node:
-            method = 'visit_' + node.__class__.__name__
-            visitor = getattr(self, method, self.generic_visit)
-            return visitor(node)
+            try:
+                visitor = self._handlers[node.__class__]
+            except KeyError:
+                visitor = self._find_handler(
+                    node.__class__, self.__class__.generic_visit)
+            return visitor(self, node)
 
     def generic_visit(self, node):
-        for field_name, value in iter_fields(node):
-            if isinstance(value, list):
-                for item in value:
-                    if isinstance(item, ast.Node):
-                        self.visit(item)
-            elif isinstance(value, ast.Node):
-                self.visit(value)
+        '''Visit children of node, nested nodes without own handler are
+        visited from an explicit stack.'''
+        generic = NodeVisitor.generic_visit
+        handlers = self._handlers
+        default = self.__class__.generic_visit
+        stack = [iter_child_nodes(node)]
+        while stack:
+            for child in stack[-1]:
+                try:
+                    handler = handlers[child.__class__]
+                except KeyError:
+                    handler = self._find_handler(child.__class__, default)
+                if handler is generic:
+                    stack.append(iter_child_nodes(child))
+                    break
+                handler(self, child)
+            else:
+                stack.pop()
+
+
+class IterativeVisitor(NodeVisitor):
+    '''Visitor whose handlers yield child nodes instead of visiting them.
+
+    A yielded node is visited before its handler resumes. Running handlers
+    are kept on an explicit stack, so trees of any depth can be visited.
+    Handlers which return None have no children to visit.
+
+    enter is called with every node before its handler and returns the
+    node to use instead, leave is called when its handler is done.
+    '''
+
+    def visit(self, root, enter=None, leave=None):
+        handlers = self._handlers
+        default = self.__class__.generic_visit
+        stack = []
+        node = root
+        while True:
+            if node:
+                if enter is not None:
+                    node = enter(node)
+                try:
+                    handler = handlers[node.__class__]
+                except KeyError:
+                    handler = self._find_handler(node.__class__, default)
+                children = handler(self, node)
+                if children is not None:
+                    stack.append((node, children))
+                elif leave is not None:
+                    leave(node)
+            while stack:
+                parent, children = stack[-1]
+                node = next(children, _DONE)
+                if node is not _DONE:
+                    break
+                stack.pop()
+                if leave is not None:
+                    leave(parent)
+            else:
+                return
+
+    def generic_visit(self, node):
+        return iter_child_nodes(node)
 
 
 class NodeTransformer(NodeVisitor):
     def generic_visit(self, node):
-        for field_name, old_value in iter_fields(node):
+        for field_name in node_fields(node.__class__):
+            old_value = getattr(node, field_name)
             if isinstance(old_value, list):
                 new_values = []
                 for value in old_value:
@@ -47,36 +156,170 @@ class NodeTransformer(NodeVisitor):
         return node
 
 
+class CopyOnWriteTransformer(NodeVisitor):
+    '''Transformer which leaves the input tree untouched.
+
+    Nodes on the path to a changed node are copied, unchanged subtrees are
+    shared with the input. Handlers must not modify nodes they get, they
+    return a new node (see copy_node) instead.
+    '''
+
+    def generic_visit(self, node):
+        '''Transform children of node, nested nodes without own handler
+        are transformed from an explicit stack.'''
+        generic = CopyOnWriteTransformer.generic_visit
+        handlers = self._handlers
+        default = self.__class__.generic_visit
+        # node, its children and transformed children
+        stack = [(node, iter_child_nodes(node), [])]
+        while True:
+            node, children, results = stack[-1]
+            for child in children:
+                try:
+                    handler = handlers[child.__class__]
+                except KeyError:
+                    handler = self._find_handler(child.__class__, default)
+                if handler is generic:
+                    stack.append((child, iter_child_nodes(child), []))
+                    break
+                results.append(handler(self, child))
+            else:
+                stack.pop()
+                node = self._copy(node, iter(results))
+                if not stack:
+                    return node
+                stack[-1][2].append(node)
+
+    def _copy(self, node, results):
+        '''Return node with children replaced by results, node itself when
+        no child has changed.'''
+        changes = None
+        for field_name in node_fields(node.__class__):
+            old_value = getattr(node, field_name)
+            if isinstance(old_value, list):
+                new_values = self._copy_list(old_value, results)
+                if new_values is None:
+                    continue
+            elif isinstance(old_value, ast.Node):
+                new_values = next(results)
+                if new_values is old_value:
+                    continue
+            else:
+                continue
+            if changes is None:
+                changes = {}
+            changes[field_name] = new_values
+        if changes is None:
+            return node
+        return copy_node(node, **changes)
+
+    def _copy_list(self, old_values, results):
+        '''Return new list or None when no item has changed.'''
+        new_values = None
+        for index, value in enumerate(old_values):
+            if isinstance(value, ast.Node):
+                new_value = next(results)
+                if new_value is value:
+                    if new_values is not None:
+                        new_values.append(value)
+                    continue
+                if new_values is None:
+                    new_values = old_values[:index]
+                if new_value is None:
+                    continue
+                elif not isinstance(new_value, ast.Node):
+                    new_values.extend(new_value)
+                    continue
+                new_values.append(new_value)
+            elif new_values is not None:
+                new_values.append(value)
+        return new_values
+
+
 def walk(root, walker):
-    visit = walker.visit
+    '''Visit nodes in depth-first order calling walker.visit(node, parent,
+    path) where path is a read only view of the node ancestors.
 
-    def _walk(node, parent, path):
+    The path is shared by the whole walk, copy it to keep it.
+    '''
+    visit = walker.visit
+    ancestors = []
+    path = ListView(ancestors)
+    stack = [(root, None, 0)]
+    while stack:
+        node, parent, depth = stack.pop()
+        del ancestors[depth:]
         visit(node, parent, path)
-        for name, child in iter_fields(node):
+        ancestors.append(node)
+        depth += 1
+        children = []
+        for name in node_fields(node.__class__):
+            child = getattr(node, name)
             if isinstance(child, list):
                 for item in child:
                     if isinstance(item, ast.Node):
-                        _walk(item, node, path + [node])
-            else:
-                if isinstance(child, ast.Node):
-                    _walk(child, node, path + [node])
-    _walk(root, None, [])
+                        children.append((item, node, depth))
+            elif isinstance(child, ast.Node):
+                children.append((child, node, depth))
+        children.reverse()
+        stack.extend(children)
 
 
-class NodeWalker:
+class NodeWalker(_Dispatcher):
     def visit(self, node, parent, path):
-        method = 'visit_' + node.__class__.__name__
-        if hasattr(self, method):
-            visitor = getattr(self, method)
-            return visitor(node, parent, path)
+        try:
+            visitor = self._handlers[node.__class__]
+        except KeyError:
+            visitor = self._find_handler(node.__class__)
+        if visitor is not None:
+            return visitor(self, node, parent, path)
 
 
 class NodeWalkers:
+    '''Run several walkers in one walk, first true result is returned.
+
+    Walkers are called only for node classes they have a handler for. The
+    handlers of a node class are looked up once per combination of walker
+    classes and shared by all instances with the same walkers. Only the
+    recently used combinations are kept, configured rule classes are
+    created at will.
+    '''
+
+    _dispatch = LRUCache(64)
+
     def __init__(self, walkers):
         self._walkers = walkers
+        classes = tuple(walker.__class__ for walker in walkers)
+        handlers = self._dispatch.get(classes)
+        if handlers is None:
+            handlers = {}
+            self._dispatch.put(classes, handlers)
+        self._handlers = handlers
 
     def visit(self, node, parent, path):
-        for walker in self._walkers:
-            result = walker.visit(node, parent, path)
+        try:
+            handlers = self._handlers[node.__class__]
+        except KeyError:
+            handlers = self._find_handlers(node.__class__)
+        for index, handler in handlers:
+            result = handler(self._walkers[index], node, parent, path)
             if result:
                 return result
+
+    def _find_handlers(self, node_class):
+        handlers = []
+        for index, walker in enumerate(self._walkers):
+            walker_class = walker.__class__
+            if walker_class.visit is not NodeWalker.visit:
+                # custom visit has to see every node
+                handlers.append((index, walker_class.visit))
+                continue
+            try:
+                handler = walker_class._handlers[node_class]
+            except KeyError:
+                handler = walker_class._find_handler(node_class)
+            if handler is not None:
+                handlers.append((index, handler))
+        handlers = tuple(handlers)
+        self._handlers[node_class] = handlers
+        return handlers
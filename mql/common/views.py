@@ -0,0 +1,37 @@
+from collections.abc import Sequence
+
+__all__ = ['ListView']
+
+
+class ListView(Sequence):
+    '''Read only view of a list, changes of the list are visible.'''
+
+    __slots__ = ('_items', )
+
+    def __init__(self, items):
+        self._items = items
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __eq__(self, other):
+        if isinstance(other, ListView):
+            return self._items == other._items
+        if isinstance(other, (list, tuple)):
+            return len(self._items) == len(other) and \
+                all(a == b for a, b in zip(self._items, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<ListView {}>'.format(repr(self._items))
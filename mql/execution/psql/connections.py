@@ -23,6 +23,28 @@ class AiopgConnection:
                 await cursor.execute(sql, params)
                 return await cursor.fetchall()
 
+    async def fetch_chunks(self, sql, params=None, size=1000):
+        '''Yield lists of at most size rows read through server side
+        cursor.'''
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute('BEGIN')
+                try:
+                    await cursor.execute(
+                        'DECLARE mql_chunks NO SCROLL CURSOR FOR ' + sql,
+                        params
+                    )
+                    while True:
+                        await cursor.execute(
+                            'FETCH FORWARD {:d} FROM mql_chunks'.format(size)
+                        )
+                        rows = await cursor.fetchall()
+                        if not rows:
+                            break
+                        yield rows
+                finally:
+                    await cursor.execute('ROLLBACK')
+
     async def fetchone(self, pool, sql, params=None):
         async with self.pool.acquire() as conn:
             async with conn.cursor() as cursor:
@@ -53,6 +75,19 @@ class AsyncpgConnection:
             params = params or []
             return await conn.fetch(query, *params, timeout=timeout)
 
+    async def fetch_chunks(self, query: str, params=None, size=1000):
+        '''Yield lists of at most size rows read through server side
+        cursor.'''
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                params = params or []
+                cursor = await conn.cursor(query, *params)
+                while True:
+                    rows = await cursor.fetch(size)
+                    if not rows:
+                        break
+                    yield rows
+
     async def fetchone(self, query: str, params=None, timeout: float=None):
         async with self.pool.acquire() as conn:
             params = params or []
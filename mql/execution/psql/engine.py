@@ -1,9 +1,14 @@
+import asyncio
+import collections
+import logging
 import re
 
-from mql.common import errors, execution
+from mql.common import errors, execution, snapshot
+from mql.common.cache import LRUCache
+from mql.common.params import shape
 
 from .generator import SqlGenerator
-from .schema import load_schema
+from .schema import load_lazy_schema, load_schema
 
 NOT_EXSITS_ERROR = re.compile(
     r'^(column|relation) "([a-z0-9_.]+)" does not exist$',
@@ -21,27 +26,161 @@ NOT_EXSITS_ERROR_2 = re.compile(
 )
 
 
+logger = logging.getLogger(__name__)
+
+SqlTemplate = collections.namedtuple('SqlTemplate', ['sql', 'params'])
+
+
 class PgsqlEngine:
-    def __init__(self, connection):
+    def __init__(self, connection, cache_size=256):
         self.connection = connection
         self._transformers = []
+        self._sql_cache = LRUCache(cache_size)
+        self._refresh_task = None
+
+    @property
+    def sql_cache(self):
+        return self._sql_cache
+
+    @property
+    def refresh_task(self):
+        '''Background validation of schema loaded from snapshot.'''
+        return self._refresh_task
+
+    async def load_schema(self, name, snapshot_path=None, on_change=None):
+        '''Load schema from catalog.
+
+        With snapshot_path a valid snapshot is used instead of the catalog
+        and checked against it in background. When they differ, table sizes
+        and column statistics included, the snapshot is rewritten and
+        on_change is called with the live schema.
+        A missing or invalid snapshot is written after loading the catalog.
+        '''
+        if snapshot_path:
+            try:
+                schema = snapshot.load(snapshot_path)
+            except errors.MqlSnapshotError as ex:
+                logger.warning(str(ex))
+            else:
+                if schema.name == name:
+                    self._sql_cache.clear()
+                    self._refresh_task = asyncio.ensure_future(
+                        self._validate_snapshot(
+                            name, schema, snapshot_path, on_change
+                        )
+                    )
+                    return schema
+        schema = await load_schema(self.connection, name)
+        self._sql_cache.clear()
+        if snapshot_path:
+            save_snapshot(schema, snapshot_path)
+        return schema
 
-    async def load_schema(self, name):
-        return await load_schema(self.connection, name)
+    async def load_lazy_schema(self, name):
+        '''Load names of tables, their columns are loaded on first use.'''
+        schema = await load_lazy_schema(self.connection, name)
+        self._sql_cache.clear()
+        return schema
+
+    def schema_changed(self, schema):
+        self._sql_cache.clear()
+
+    async def _validate_snapshot(self, name, schema, snapshot_path,
+                                 on_change):
+        try:
+            live_schema = await load_schema(self.connection, name)
+        except Exception:
+            logger.exception('Schema snapshot validation failed')
+            return
+        # serialize leaves out planner estimates, the cost guard uses them
+        if live_schema.serialize() == schema.serialize() and \
+                planner_stats(live_schema) == planner_stats(schema):
+            return
+        logger.info('Schema snapshot of "%s" is out of date', name)
+        save_snapshot(live_schema, snapshot_path)
+        self._sql_cache.clear()
+        if on_change:
+            on_change(live_schema)
 
     async def execute(self, context):
-        sql = self.build_sql(context.ast_document)
+        template = self.compile(context.ast_document)
+        check_params(template, context.params)
+        return await self.execute_sql(template.sql, context.params)
+
+    def prepare(self, ast_document):
+        return PreparedStatement(self, self.compile(ast_document))
+
+    async def execute_sql(self, sql, params=None):
         try:
-            print(sql, context.params)
-            data = await self.connection.fetchall(sql, context.params)
+            if params is None and self.connection.placeholder == 'percent':
+                # escaped % is read only when params are given
+                params = []
+            logger.debug('Execute %s with %s', sql, params)
+            data = await self.connection.fetchall(sql, params)
             return execution.ExecuteResult(data[0][0], encoded=True)
         except Exception as ex:
             raise errors.MqlEngineError(*extract_error(ex)) from ex
 
     def build_sql(self, ast_document):
-        generator = SqlGenerator(self.connection.placeholder)
-        generator.visit(ast_document)
-        return generator.to_sql()
+        return self.compile(ast_document).sql
+
+    def create_generator(self):
+        return SqlGenerator(self.connection.placeholder)
+
+    def statement(self, generator):
+        '''Return statement for SQL emitted by generator.'''
+        template = SqlTemplate(generator.to_sql(), generator.params)
+        return PreparedStatement(self, template)
+
+    def compile(self, ast_document):
+        '''Return SQL template, generated once per document shape.'''
+        placeholder = self.connection.placeholder
+        key = (placeholder, shape(ast_document))
+        template = self._sql_cache.get(key)
+        if template is None:
+            generator = self.create_generator()
+            generator.visit(ast_document)
+            template = SqlTemplate(generator.to_sql(), generator.params)
+            self._sql_cache.put(key, template)
+        return template
+
+
+class PreparedStatement:
+    __slots__ = ('engine', 'sql', 'params')
+
+    def __init__(self, engine, template):
+        self.engine = engine
+        self.sql = template.sql
+        self.params = template.params
+
+    async def execute(self, params=None):
+        check_params(self, params)
+        return await self.engine.execute_sql(self.sql, params)
+
+
+def planner_stats(schema):
+    '''Return sizes and column statistics of schema tables.'''
+    return [
+        (table.name, table.rows, table.pages,
+         [column.stats for column in table.columns])
+        for table in schema.tables
+    ]
+
+
+def save_snapshot(schema, path):
+    '''Write snapshot, a failure is logged since the schema is usable.'''
+    try:
+        snapshot.save(schema, path)
+    except errors.MqlSnapshotError as ex:
+        logger.warning(str(ex))
+
+
+def check_params(template, params):
+    size = len(params) if params else 0
+    if size != template.params:
+        msg = 'Expected {} query params but got {}'.format(
+            template.params, size)
+        raise errors.MqlEngineError(msg, True)
 
 
 def extract_error(exception):
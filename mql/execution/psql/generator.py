@@ -1,4 +1,4 @@
-from mql.common.traverse import NodeVisitor
+from mql.common.traverse import IterativeVisitor
 
 
 class NumberPlaceholder:
@@ -21,9 +21,18 @@ PLACEHOLDERS = {
 }
 
 
-class SqlGenerator(NodeVisitor):
+class SqlGenerator(IterativeVisitor):
+    '''Generate SQL of document.
+
+    Handlers yield child nodes to emit their SQL in place, so filters of
+    any depth are generated without recursion.
+    '''
+
     def __init__(self, placeholder='percent'):
         self.placeholder = PLACEHOLDERS[placeholder]()
+        # percent style drivers read % of the statement as format directive
+        self.escape_percent = placeholder == 'percent'
+        self.params = 0
         self._buff = []
 
     def to_sql(self):
@@ -45,7 +54,7 @@ class SqlGenerator(NodeVisitor):
 
     def visitList(self, items, separator=','):
         for i, item in enumerate(items):
-            self.visit(item)
+            yield item
             if i < len(items) - 1:
                 self._buff.append(separator)
                 self.space()
@@ -55,42 +64,42 @@ class SqlGenerator(NodeVisitor):
         self.append('SELECT ')
         self.append('array_to_json(array_agg(row_to_json(data)))::text ')
         self.append('FROM (SELECT ')
-        self.visitList(node.results)
-        self.visit(node.table)
-        self.visit(node.where)
-        self.visit(node.order)
-        self.visit(node.limit)
-        self.visit(node.offset)
+        yield from self.visitList(node.results)
+        yield node.table
+        yield node.where
+        yield node.order
+        yield node.limit
+        yield node.offset
         self.append(') as data')
 
     def visit_UpdateStatement(self, node):
         self.append('UPDATE ')
-        self.visit(node.table)
+        yield node.table
         self.append('SET')
         self.space()
-        self.visitList(node.columns)
+        yield from self.visitList(node.columns)
         self.space()
         self.token('WHERE')
-        self.visit(node.where)
+        yield node.where
 
     def visit_InsertStatement(self, node):
         self.append('INSERT INTO')
         self.space()
-        self.visit(node.table)
+        yield node.table
         self.space()
         self.append('(')
-        self.visitList(node.results)
+        yield from self.visitList(node.results)
         self.append(') VALUES (')
-        self.visitList(node.values)
+        yield from self.visitList(node.values)
         self.append(')')
 
     def visit_DeleteStatement(self, node):
         self.append('DELETE FROM')
         self.space()
-        self.visit(node.table)
+        yield node.table
         self.space()
         self.token('WHERE')
-        self.visit(node.where)
+        yield node.where
 
     def visit_SelectIdentifier(self, node):
         name = node.name if not node.alias else node.name + ' as ' + node.alias
@@ -114,24 +123,24 @@ class SqlGenerator(NodeVisitor):
     def visit_UpdateColumn(self, node):
         self.append(node.name)
         self.append('=')
-        self.visit(node.value)
+        yield node.value
 
     def visit_SelectWhere(self, node):
         self.token('WHERE')
-        self.visit(node.condition)
+        yield node.condition
         self.space()
 
     def visit_BinaryExpression(self, node):
         self.append('(')
-        self.visit(node.left)
+        yield node.left
         self.append(node.operator)
-        self.visit(node.right)
+        yield node.right
         self.append(')')
 
     def visit_LogicalExpression(self, node):
-        self.visit(node.left)
+        yield node.left
         self.append(node.operator)
-        self.visit(node.right)
+        yield node.right
 
     def visit_Identifier(self, node):
         self.append(node.name)
@@ -140,14 +149,22 @@ class SqlGenerator(NodeVisitor):
         self.append(str(node.value))
 
     def visit_String(self, node):
-        self.append("'{}'".format(node.value))
+        value = node.value.replace("'", "''")
+        if self.escape_percent:
+            value = value.replace('%', '%%')
+        self.append("'{}'".format(value))
 
     def visit_Placeholder(self, node):
+        self.params += 1
+        self.token(self.placeholder())
+
+    def visit_Parameter(self, node):
+        self.params += 1
         self.token(self.placeholder())
 
     def visit_SelectOrder(self, node):
         self.token('ORDER BY')
-        self.visitList(node.items)
+        yield from self.visitList(node.items)
 
     def visit_SelectOrderItem(self, node):
         self.token(node.name)
@@ -1,22 +1,71 @@
 # import os
 import collections
+import functools
 import re
 from pathlib import Path
 
 from mql.common import schema
 
+from .generator import PLACEHOLDERS
 
-async def load_schema(connection, name):
-    sql_file = Path(__file__).parent / 'schema.sql'
-    with open(sql_file) as f:
-        SQL = f.read()
-    rows = await connection.fetchall(SQL)
-    builder = Builder()
-    for row in rows:
-        builder.add(row[0])
+CLASS_FILTER = '/* class filter */'
+
+CHUNK_SIZE = 1000
+
+
+@functools.lru_cache()
+def read_sql(name):
+    with open(Path(__file__).parent / name) as f:
+        return f.read()
+
+
+async def load_schema(connection, name, chunk_size=CHUNK_SIZE):
+    '''Build schema from catalog.
+
+    When the connection can fetch rows in chunks, rows are fed into the
+    builder as they arrive and only one chunk is kept at a time.
+    '''
+    sql = read_sql('schema.sql')
+    fetch_chunks = getattr(connection, 'fetch_chunks', None)
+    if fetch_chunks is None:
+        builder = Builder()
+        for row in await connection.fetchall(sql):
+            builder.add(row[0])
+        return builder.get_schema(name)
+
+    builder = StreamBuilder()
+    async for rows in fetch_chunks(sql, size=chunk_size):
+        for row in rows:
+            builder.add(row[0])
     return builder.get_schema(name)
 
 
+async def load_lazy_schema(connection, name):
+    '''Load names of tables only, the rest on first use of a table.'''
+    rows = await connection.fetchall(read_sql('tables.sql'))
+    class_ids = {}
+    for row in rows:
+        data = row[0]
+        table_name = '{}.{}'.format(data['namespace'], data['name'])
+        class_ids[table_name] = data['id']
+
+    async def load_tables(names):
+        sql = read_sql('schema.sql')
+        if connection.placeholder == 'percent':
+            sql = sql.replace('%', '%%')
+        placeholder = PLACEHOLDERS[connection.placeholder]()()
+        sql = sql.replace(
+            CLASS_FILTER, 'and oid = ANY({})'.format(placeholder)
+        )
+        ids = [class_ids[name] for name in names]
+        builder = Builder()
+        for row in await connection.fetchall(sql, [ids]):
+            builder.add(row[0])
+        return list(builder.get_tables())
+
+    return schema.LazySourceSchema(name, class_ids, load_tables)
+
+
 # https://www.postgresql.org/docs/10/static/catalog-pg-class.html
 # pg_catalog.pg_class.relkind
 CLASS_KIND_TABLE = 'r'
@@ -39,6 +88,12 @@ CONSTRAINT_TYPE_UNIQUE = 'u'
 CONSTRAINT_TYPE_TRIGGER = 't'
 CONSTRAINT_TYPE_EXCLUSION = 'x'
 
+CONSTRAINT_KINDS = {
+    CONSTRAINT_TYPE_PRIMARY_KEY: 'primary_key',
+    CONSTRAINT_TYPE_FOREIGN_KEY: 'foreign_key',
+    CONSTRAINT_TYPE_UNIQUE: 'unique',
+}
+
 # https://www.postgresql.org/docs/10/static/catalog-pg-type.html
 TYPE_BASE = 'b'
 TYPE_COMPOSITE = 'c'
@@ -104,6 +159,10 @@ class ConstraintNode(Node):
         self.fclass_id = data['fclass_id']
         self.refs = data['conkey']
         self.frefs = data['confkey']
+        # names of foreign table and columns, used when the foreign class
+        # is not loaded, missing in older catalog rows
+        self.ftable = data.get('ftable')
+        self.fcolumns = data.get('fcolumns')
 
     @property
     def is_primary_key(self):
@@ -114,11 +173,28 @@ class ConstraintNode(Node):
             self.kind, self.name, self.class_id, self.fclass_id, self.refs, self.frefs)
 
 
+class IndexNode(Node):
+    def __init__(self, data):
+        self.name = data['name']
+        self.class_id = data['class_id']
+        self.keys = data['keys']
+        self.unique = data['unique']
+        self.primary = data['primary']
+        self.method = data['method']
+
+    def __repr__(self):
+        return 'IndexNode(name={} class_id={} keys={})'.format(
+            self.name, self.class_id, self.keys)
+
+
 class ClassNode(Node):
     def __init__(self, data):
         self.id = data['id']
         self.kind = data['kind']
         self.name = data['name']
+        # missing in catalog rows of older snapshots and tests
+        self.rows = data.get('rows')
+        self.pages = data.get('pages')
         self.attrs = []
         self.type = None
         self.namespace = None
@@ -154,24 +230,29 @@ class AttrNode(Node):
 
 
 class Builder:
+    '''Collect catalog rows and build source schema.
+
+    Nodes are indexed by id and attributes and primary keys are bucketed
+    per class, so building a schema is linear in the number of rows.
+    '''
+
     def __init__(self):
-        self.nss = []
-        self.types = []
-        self.classes = []
-        self.attrs = []
-        self.constraints = []
-        self.enums = []
+        self.nss = {}
+        self.types = {}
+        self.classes = {}
+        self.attrs = collections.defaultdict(list)
+        self.constraints = collections.defaultdict(list)
+        self.enums = {}
+        self.primary_keys = collections.defaultdict(set)
+        self.indexes = collections.defaultdict(list)
+        self.stats = collections.defaultdict(dict)
 
     def is_primary_key(self, attr):
-        for constraint in self.constraints:
-            if constraint.is_primary_key and constraint.class_id == attr.class_id:
-                if attr.num in constraint.refs:
-                    return True
-        return False
+        keys = self.primary_keys.get(attr.class_id)
+        return bool(keys) and attr.num in keys
 
     def get_columns(self, class_id):
         for attr in self.get_attrs(class_id):
-            # constraint = self.get_constraint(class_id)
             kind, value, length = parse_attr(attr)
             column = schema.Column(
                 attr.name,
@@ -184,10 +265,9 @@ class Builder:
             if attr.enum:
                 for label in attr.enum.labels:
                     column.add_enum(label)
-
-            # print('*'*100)
-            # print(attr)
-            # print(column.serialize())
+            stats = self.stats.get(class_id)
+            if stats and attr.name in stats:
+                column.stats = stats[attr.name]
             yield column
 
     def add(self, data):
@@ -195,59 +275,60 @@ class Builder:
         getattr(self, method_name)(data)
 
     def add_namespace(self, data):
-        self.nss.append(NamespaceNode(data))
+        node = NamespaceNode(data)
+        self.nss[node.id] = node
 
     def add_type(self, data):
-        self.types.append(TypeNode(data))
+        node = TypeNode(data)
+        self.types[node.id] = node
 
     def add_enum(self, data):
-        type_id = data['type_id']
-        for node in self.enums:
-            if node.id == type_id:
-                node.add_label(data['label'])
-                return
-        self.enums.append(EnumNode(data))
+        node = self.enums.get(data['type_id'])
+        if node is None:
+            node = EnumNode(data)
+            self.enums[node.id] = node
+        else:
+            node.add_label(data['label'])
 
     def add_constraint(self, data):
         node = ConstraintNode(data)
-        self.constraints.append(node)
+        self.constraints[node.class_id].append(node)
+        if node.is_primary_key:
+            self.primary_keys[node.class_id].update(node.refs or ())
+
+    def add_index(self, data):
+        node = IndexNode(data)
+        self.indexes[node.class_id].append(node)
+
+    def add_stat(self, data):
+        self.stats[data['class_id']][data['name']] = schema.ColumnStats(
+            data['null_frac'], data['n_distinct'], data['avg_width']
+        )
 
     def add_class(self, data):
         node = ClassNode(data)
         node.type = self.find_type(data)
         node.namespace = self.find_namespace(data)
-        self.classes.append(node)
+        self.classes[node.id] = node
 
     def add_attribute(self, data):
         node = AttrNode(data)
         node.type = self.find_type(data)
         node.enum = self.find_enum(data)
         node.is_primary = self.is_primary_key(node)
-        self.attrs.append(node)
+        self.attrs[node.class_id].append(node)
 
     def find_namespace(self, data):
-        namespace_id = data['namespace_id']
-        for node in self.nss:
-            if node.id == namespace_id:
-                return node
+        return self.nss.get(data['namespace_id'])
 
     def find_type(self, data):
-        type_id = data['type_id']
-        for node in self.types:
-            if node.id == type_id:
-                return node
+        return self.types.get(data['type_id'])
 
     def find_enum(self, data):
-        type_id = data['type_id']
-        for node in self.enums:
-            if node.id == type_id:
-                return node
+        return self.enums.get(data['type_id'])
 
     def find_class(self, data):
-        class_id = data['class_id']
-        for node in self.classes:
-            if node.id == class_id:
-                return node
+        return self.classes.get(data['class_id'])
 
     def get_schema(self, name):
         source_type = schema.SourceSchema(name)
@@ -256,17 +337,120 @@ class Builder:
         return source_type
 
     def get_tables(self):
-        for clazz in self.classes:
-            name = '{}.{}'.format(clazz.namespace.name, clazz.name)
-            table = schema.Table(name, clazz.kind)
-            for column in self.get_columns(clazz.id):
-                table.add_column(column)
-            yield table
+        for clazz in self.classes.values():
+            yield self.build_table(clazz)
+
+    def build_table(self, clazz):
+        table = schema.Table(
+            self.get_table_name(clazz), clazz.kind,
+            rows=clazz.rows, pages=clazz.pages
+        )
+        for column in self.get_columns(clazz.id):
+            table.add_column(column)
+        for constraint in self.get_constraints(clazz.id):
+            table.add_constraint(constraint)
+        for index in self.get_indexes(clazz.id):
+            table.add_index(index)
+        return table
+
+    def get_indexes(self, class_id):
+        names = {attr.num: attr.name for attr in self.get_attrs(class_id)}
+        for node in self.indexes.get(class_id, ()):
+            yield schema.Index(
+                node.name,
+                [names.get(num) for num in node.keys or ()],
+                node.unique,
+                node.primary,
+                node.method
+            )
+
+    def get_table_name(self, clazz):
+        return '{}.{}'.format(clazz.namespace.name, clazz.name)
+
+    def get_constraints(self, class_id):
+        for node in self.constraints.get(class_id, ()):
+            foreign_table = foreign_columns = None
+            fclass = self.classes.get(node.fclass_id)
+            if fclass is not None:
+                foreign_table = self.get_table_name(fclass)
+                foreign_columns = self.get_attr_names(fclass.id, node.frefs)
+            elif node.ftable is not None:
+                foreign_table = node.ftable
+                foreign_columns = list(node.fcolumns or ())
+            yield schema.Constraint(
+                node.name,
+                CONSTRAINT_KINDS.get(node.kind, node.kind),
+                self.get_attr_names(class_id, node.refs),
+                foreign_table,
+                foreign_columns
+            )
+
+    def get_attr_names(self, class_id, nums):
+        names = {attr.num: attr.name for attr in self.get_attrs(class_id)}
+        return [names[num] for num in nums or () if num in names]
 
     def get_attrs(self, class_id):
-        for attr in self.attrs:
-            if attr.class_id == class_id:
-                yield attr
+        return iter(self.attrs.get(class_id, ()))
+
+
+class StreamBuilder(Builder):
+    '''Builder which turns a class into table as soon as all its attributes
+    have been added and releases its attribute and constraint nodes.
+
+    Attribute rows have to come grouped by class and after all class and
+    constraint rows, as schema.sql returns them.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.tables = {}
+        self.attr_names = {}
+        self._current = None
+        self._pending = []
+
+    def add_attribute(self, data):
+        class_id = data['class_id']
+        if class_id != self._current:
+            self._finish(self._current)
+            self._current = class_id
+        super().add_attribute(data)
+
+    def get_tables(self):
+        self._finish(self._current)
+        self._current = None
+        # foreign columns of tables built before their foreign table
+        for constraint, fclass_id, frefs in self._pending:
+            constraint.foreign_columns = self.get_attr_names(fclass_id, frefs)
+        self._pending = []
+        for clazz in self.classes.values():
+            table = self.tables.pop(clazz.id, None)
+            yield table if table is not None else self.build_table(clazz)
+
+    def get_attr_names(self, class_id, nums):
+        names = self.attr_names.get(class_id)
+        if names is None:
+            return super().get_attr_names(class_id, nums)
+        return [names[num] for num in nums or () if num in names]
+
+    def _finish(self, class_id):
+        clazz = self.classes.get(class_id)
+        if clazz is None or class_id in self.tables:
+            return
+        table = self.build_table(clazz)
+        nodes = self.constraints.get(class_id, ())
+        for node, constraint in zip(nodes, table.constraints):
+            fclass_id = node.fclass_id
+            if fclass_id in self.classes and fclass_id != class_id and \
+                    fclass_id not in self.attr_names:
+                self._pending.append((constraint, fclass_id, node.frefs))
+        self.attr_names[class_id] = {
+            attr.num: attr.name for attr in self.get_attrs(class_id)
+        }
+        self.tables[class_id] = table
+        self.attrs.pop(class_id, None)
+        self.constraints.pop(class_id, None)
+        self.indexes.pop(class_id, None)
+        self.stats.pop(class_id, None)
 
 
 MATCH_VARCHAR = re.compile(r'character varying\((\d+)\)', re.I)
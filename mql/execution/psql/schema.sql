@@ -16,7 +16,9 @@ WITH
       relname AS "name",
       relnamespace AS "namespace_id",
       reltype AS "type_id",
-      relkind as "kind"
+      relkind as "kind",
+      reltuples AS "rows",
+      relpages AS "pages"
       --,
       --(pg_catalog.pg_relation_is_updatable(oid, true)::bit(8) & B'00010000') = B'00010000' AS "insertable",
       --(pg_catalog.pg_relation_is_updatable(oid, true)::bit(8) & B'00001000') = B'00001000' AS "updatable",
@@ -25,6 +27,7 @@ WITH
     WHERE relnamespace in (SELECT "id" FROM namespace)
       and relpersistence in ('p')
       and relkind in ('r', 'v', 'm', 'c', 'f')
+      /* class filter */
     ORDER BY relnamespace, relname
   ),
   -- @see https://www.postgresql.org/docs/9.5/static/catalog-pg-attribute.html
@@ -55,12 +58,59 @@ WITH
       conrelid as "class_id",
       nullif(confrelid, 0) as "fclass_id",
       conkey,
-      confkey
+      confkey,
+      -- foreign table and columns by name, the foreign class may be
+      -- left out by the class filter
+      (SELECT fn.nspname || '.' || fc.relname
+       FROM pg_catalog.pg_class fc
+       JOIN pg_catalog.pg_namespace fn ON fn.oid = fc.relnamespace
+       WHERE fc.oid = confrelid) AS "ftable",
+      (SELECT array_agg(fa.attname ORDER BY fk.i)
+       FROM unnest(confkey) WITH ORDINALITY AS fk(num, i)
+       JOIN pg_catalog.pg_attribute fa ON fa.attrelid = confrelid
+                                      AND fa.attnum = fk.num) AS "fcolumns"
    FROM pg_catalog.pg_constraint
    WHERE
 	conrelid in (select "id" from class) AND
 	contype in ('f', 'p', 'u') AND
-	CASE WHEN contype = 'f' THEN confrelid in (SELECT "id" FROM class) ELSE TRUE END
+	CASE WHEN contype = 'f' THEN confrelid in (
+	  SELECT oid FROM pg_catalog.pg_class
+	  WHERE relnamespace in (SELECT "id" FROM namespace)
+	    and relpersistence in ('p')
+	    and relkind in ('r', 'v', 'm', 'c', 'f')
+	) ELSE TRUE END
+  ),
+  -- @see https://www.postgresql.org/docs/10/static/catalog-pg-index.html
+  -- keys are attribute numbers, 0 for expression
+  "index" AS (
+    SELECT
+      'index' AS "type",
+      c.relname AS "name",
+      i.indrelid AS "class_id",
+      i.indkey::int2[] AS "keys",
+      i.indisunique AS "unique",
+      i.indisprimary AS "primary",
+      am.amname AS "method"
+    FROM pg_catalog.pg_index i
+    JOIN pg_catalog.pg_class c ON c.oid = i.indexrelid
+    JOIN pg_catalog.pg_am am ON am.oid = c.relam
+    WHERE i.indrelid IN (SELECT "id" FROM class) AND i.indisvalid
+    ORDER BY i.indrelid, c.relname
+  ),
+  -- @see https://www.postgresql.org/docs/10/static/view-pg-stats.html
+  stat AS (
+    SELECT
+      'stat' AS "type",
+      c.oid AS "class_id",
+      s.attname AS "name",
+      s.null_frac AS "null_frac",
+      s.n_distinct AS "n_distinct",
+      s.avg_width AS "avg_width"
+    FROM pg_catalog.pg_stats s
+    JOIN pg_catalog.pg_namespace n ON n.nspname = s.schemaname
+    JOIN pg_catalog.pg_class c ON c.relnamespace = n.oid
+                              AND c.relname = s.tablename
+    WHERE c.oid IN (SELECT "id" FROM class) AND NOT s.inherited
   ),
   type as (
     SELECT
@@ -92,14 +142,44 @@ WITH
        t.typtype = 'e' AND t.oid IN (SELECT type_id FROM attribute)
     ORDER BY namespace_id, name, label
 )
-SELECT row_to_json(x) AS object FROM namespace AS x
-UNION ALL
-SELECT row_to_json(x) AS object FROM "type" AS x
-UNION ALL
-SELECT row_to_json(x) AS object FROM "enums" AS x
-UNION ALL
-SELECT row_to_json(x) AS object FROM "constraint" AS x
-UNION ALL
-SELECT row_to_json(x) AS object FROM class AS x
-UNION ALL
-SELECT row_to_json(x) AS object FROM attribute AS x
+-- rows are ordered explicitly, UNION ALL does not keep the order of its
+-- branches, and StreamBuilder needs attributes grouped by class after
+-- all other rows
+SELECT "object" FROM (
+  SELECT 1 AS "kind", NULL::oid AS "class_id",
+         row_number() OVER (ORDER BY x.name) AS "position",
+         row_to_json(x) AS "object"
+  FROM namespace AS x
+  UNION ALL
+  SELECT 2, NULL::oid,
+         row_number() OVER (ORDER BY x.namespace_id, x.name),
+         row_to_json(x)
+  FROM "type" AS x
+  UNION ALL
+  SELECT 3, NULL::oid,
+         row_number() OVER (ORDER BY x.namespace_id, x.name, x.label),
+         row_to_json(x)
+  FROM "enums" AS x
+  UNION ALL
+  SELECT 4, x.class_id, row_number() OVER (ORDER BY x.class_id, x.name),
+         row_to_json(x)
+  FROM "constraint" AS x
+  UNION ALL
+  SELECT 5, x.class_id, row_number() OVER (ORDER BY x.class_id, x.name),
+         row_to_json(x)
+  FROM "index" AS x
+  UNION ALL
+  SELECT 6, x.class_id, row_number() OVER (ORDER BY x.class_id, x.name),
+         row_to_json(x)
+  FROM stat AS x
+  UNION ALL
+  SELECT 7, NULL::oid,
+         row_number() OVER (ORDER BY x.namespace_id, x.name),
+         row_to_json(x)
+  FROM class AS x
+  UNION ALL
+  SELECT 8, x.class_id, row_number() OVER (ORDER BY x.class_id, x.num),
+         row_to_json(x)
+  FROM attribute AS x
+) AS catalog
+ORDER BY "kind", "class_id", "position"
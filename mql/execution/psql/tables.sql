@@ -0,0 +1,13 @@
+-- names of table like classes, see class in schema.sql
+SELECT row_to_json(x) AS object FROM (
+  SELECT
+    c.oid AS "id",
+    n.nspname AS "namespace",
+    c.relname AS "name"
+  FROM pg_catalog.pg_class c
+  JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+  WHERE n.nspname NOT IN ('information_schema') and n.nspname NOT ILIKE 'pg_%'
+    and c.relpersistence in ('p')
+    and c.relkind in ('r', 'v', 'm', 'c', 'f')
+  ORDER BY n.nspname, c.relname
+) AS x
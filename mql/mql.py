@@ -1,42 +1,106 @@
+import json
 import sys
 import traceback
 
 from mql.common import ast, errors, execution
-from mql.common.traverse import NodeTransformer
+from mql.common.cache import LRUCache
+from mql.common.params import LiteralTransformer, ParamsBinder, params_types
+from mql.common.source import load_schemas
+from mql.common.traverse import CopyOnWriteTransformer, copy_node
 from mql.parser.parser import parse
+from mql.pipeline import Pipeline
 from mql.validation import validate
 
 
 class Mql:
-    def __init__(self, sources, default_source='default', transformers=None):
+    def __init__(self, sources, default_source='default', transformers=None,
+                 cache_size=128, parametrize=False, pipeline=False,
+                 encode_schema=False, rules=None, limits=None,
+                 validation_cache_size=0):
+        self._cache = LRUCache(cache_size)
+        self._validation_cache = LRUCache(validation_cache_size)
+        self._parametrizer = LiteralTransformer() if parametrize else None
+        self._rules = rules
+        self._limits = limits
         self._transformers = [
             SourceTransformer(default_source)
         ]
         self._sources = [
             SourceListExcecutor(),
-            SourceTableExcecutor(),
-            *sources
+            SourceTableExcecutor(encode_schema),
         ]
+        for source in sources:
+            self._add_source(source)
+        self._pipeline = Pipeline(
+            self._transformers, rules, self._parametrizer,
+            self._validation_cache
+        ) if pipeline else None
         if transformers:
             for transformer in transformers:
                 self.add_transformer(transformer)
 
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def validation_cache(self):
+        return self._validation_cache
+
     def add_source(self, source):
+        self._add_source(source)
+        self._cache.clear()
+
+    def _add_source(self, source):
         self._sources.append(source)
+        add_listener = getattr(source, 'add_listener', None)
+        if add_listener:
+            add_listener(self._schema_changed)
+
+    def _schema_changed(self, source, old_schema, new_schema):
+        self._cache.prune(lambda key, entry: entry[1] is source)
+        version = schema_version(old_schema)
+        if version is not None:
+            self._validation_cache.prune(lambda key, _: key[1] == version)
+
+    async def load_schemas(self, concurrency=8, loader=None, timeout=None):
+        '''Load schemas of all sources which can load one, see
+        mql.common.source.load_schemas.'''
+        sources = [
+            source for source in self._sources
+            if not is_describe_source(source) and (loader or hasattr(
+                getattr(source, 'executor', None), 'load_schema'))
+        ]
+        return await load_schemas(sources, concurrency, loader, timeout)
 
     def add_transformer(self, transformer):
         self._transformers.append(transformer)
+        self._cache.clear()
+        self._validation_cache.clear()
+        if self._pipeline:
+            self._pipeline.clear()
 
     async def execute(self, query, params=None):
         try:
-            ast_document = parse(query)
-            for transformer in self._transformers:
-                ast_document = transformer.visit(ast_document)
+            if self._pipeline:
+                ast_document, source = self._pipeline.resolve(
+                    parse(query, limits=self._limits), self._find_source
+                )
+                await load_tables(source.schema, ast_document)
+                prepared, errors = self._run_pipeline(
+                    query, ast_document, source, params
+                )
+                if errors:
+                    return execution.ExecuteResult(errors=errors)
+                return await prepared.execute(params)
 
-            source = self._find_source(ast_document)
-            errors = validate(source.schema, ast_document, params)
+            ast_document, source, binder, errors = await self._compile_async(
+                query, params
+            )
             if errors:
                 return execution.ExecuteResult(errors=errors)
+            if binder:
+                params = binder.bind(params)
 
             context = execution.ExecutionContext(
                 self._sources,
@@ -52,6 +116,115 @@ class Mql:
             traceback.print_tb(exc_traceback)
             return execution.ExecuteResult(errors=[ex])
 
+    def prepare(self, query, params=None):
+        '''Compile query once for repeated execution.
+
+        Raises MqlValidationError when the query does not pass validation.
+        Tables of lazy schemas are not loaded here, execute the query or
+        load them in advance to validate it against their metadata.
+        '''
+        if self._pipeline:
+            ast_document, source = self._pipeline.resolve(
+                parse(query, limits=self._limits), self._find_source
+            )
+            prepared, errors_ = self._run_pipeline(
+                query, ast_document, source, params
+            )
+            if errors_:
+                raise errors.MqlValidationError(errors_)
+            return prepared
+
+        ast_document, source, binder, errors_ = self._compile(query, params)
+        if errors_:
+            raise errors.MqlValidationError(errors_)
+        return execution.PreparedQuery(
+            self._sources,
+            source,
+            ast_document,
+            query,
+            source.prepare(ast_document),
+            binder
+        )
+
+    def _compile(self, query, params):
+        '''Parse, transform and validate query.
+
+        Valid documents are cached by query text and parameter types. The
+        cached document has already been transformed and is shared between
+        requests, so executors must treat it as read only. An entry is
+        dropped when the schema of its source has been replaced.
+        '''
+        key = (query, params_types(params))
+        compiled = self._lookup(key)
+        if compiled is not None:
+            return compiled
+        ast_document, source = self._analyze(query)
+        return self._validate(key, ast_document, source, params)
+
+    async def _compile_async(self, query, params):
+        '''Same as _compile, loads tables of lazy schema before
+        validation.'''
+        key = (query, params_types(params))
+        compiled = self._lookup(key)
+        if compiled is not None:
+            return compiled
+        ast_document, source = self._analyze(query)
+        await load_tables(source.schema, ast_document)
+        return self._validate(key, ast_document, source, params)
+
+    def _lookup(self, key):
+        entry = self._cache.get(key)
+        if entry is not None:
+            ast_document, source, version, binder = entry
+            if schema_version(source.schema) == version:
+                return ast_document, source, binder, None
+            self._cache.discard(key)
+
+    def _analyze(self, query):
+        ast_document = parse(query, limits=self._limits)
+        for transformer in self._transformers:
+            ast_document = transformer.visit(ast_document)
+        return ast_document, self._find_source(ast_document)
+
+    def _validate(self, key, ast_document, source, params):
+        schema = source.schema
+        errors = validate(
+            schema, ast_document, params, self._rules,
+            self._validation_cache
+        )
+        if errors:
+            return ast_document, source, None, errors
+
+        binder = None
+        if self._parametrizer:
+            ast_document = self._parametrizer.visit(ast_document)
+            binder = ParamsBinder(ast_document)
+        # validated without metadata of lazy tables, see prepare
+        if not missing_tables(schema, ast_document):
+            self._cache.put(
+                key, (ast_document, source, schema_version(schema), binder)
+            )
+        return ast_document, source, binder, None
+
+    def _run_pipeline(self, query, ast_document, source, params):
+        '''Transform, validate and generate SQL in one traversal.
+
+        Pipeline results are not cached, transformers are free to change
+        nodes of the freshly parsed document.
+        '''
+        result = self._pipeline.run(ast_document, source, params)
+        if result.errors:
+            return None, result.errors
+        prepared = execution.PreparedQuery(
+            self._sources,
+            result.source,
+            result.ast_document,
+            query,
+            result.statement,
+            result.binder
+        )
+        return prepared, None
+
     def _find_source(self, ast_document):
         for source in self._sources:
             if source.match(ast_document):
@@ -59,6 +232,23 @@ class Mql:
         raise errors.MqlError('Not found source')
 
 
+def schema_version(schema):
+    return getattr(schema, 'version', None)
+
+
+def missing_tables(schema, ast_document):
+    '''Return names of lazy schema tables used by document, not loaded.'''
+    find_missing = getattr(schema, 'missing_tables', None)
+    return find_missing(ast_document) if find_missing else []
+
+
+async def load_tables(schema, ast_document):
+    '''Load tables of lazy schema referenced by document.'''
+    names = missing_tables(schema, ast_document)
+    if names:
+        await schema.load_tables(names)
+
+
 def is_describe_source(source):
     return isinstance(source, (SourceListExcecutor, SourceTableExcecutor))
 
@@ -68,6 +258,9 @@ class SourceListExcecutor:
     def schema(self):
         return None
 
+    def prepare(self, ast_document):
+        return None
+
     def match(self, ast_document):
         return isinstance(ast_document, ast.ShowSourcesStatement)
 
@@ -80,16 +273,43 @@ class SourceListExcecutor:
 
 
 class SourceTableExcecutor:
+    '''Describe source schema.
+
+    Full description is serialized once per schema, with encode it is
+    returned as JSON text built once as well.
+    '''
+
+    def __init__(self, encode=False):
+        self.encode = encode
+
     @property
     def schema(self):
         return None
 
+    def prepare(self, ast_document):
+        return None
+
     def match(self, ast_document):
         return isinstance(ast_document, ast.ShowSourceStatement)
 
     async def execute(self, context):
         source = self._find_source(context)
-        return execution.ExecuteResult(source.schema.serialize())
+        schema = source.schema
+        stmt = context.ast_document
+        if stmt.pattern is None and stmt.limit is None and \
+                stmt.offset is None:
+            if self.encode:
+                return execution.ExecuteResult(schema.to_json(), encoded=True)
+            return execution.ExecuteResult(schema.serialize())
+        data = dict(
+            name=schema.name,
+            tables=schema.serialize_tables(
+                stmt.pattern, stmt.limit, stmt.offset
+            )
+        )
+        if self.encode:
+            data = json.dumps(data, separators=(',', ':'))
+        return execution.ExecuteResult(data, encoded=self.encode)
 
     def _find_source(self, context):
         source_name = context.ast_document.source.name
@@ -99,7 +319,7 @@ class SourceTableExcecutor:
         raise errors.MqlError('Not found source')
 
 
-class SourceTransformer(NodeTransformer):
+class SourceTransformer(CopyOnWriteTransformer):
 
     def __init__(self, default_name):
         self.default_name = default_name
@@ -117,12 +337,14 @@ class SourceTransformer(NodeTransformer):
         return self.fix_table_name(node)
 
     def fix_table_name(self, node):
-        if not node.table.source:
-            name = node.table.name
-            parts = name.split('.')
-            if len(parts) == 3:
-                node.table.source = parts.pop(0)
-                node.table.name = '.'.join(parts)
-            else:
-                node.table.source = self.default_name
-        return node
+        table = node.table
+        if table.source:
+            return node
+        parts = table.name.split('.')
+        if len(parts) == 3:
+            table = copy_node(
+                table, source=parts.pop(0), name='.'.join(parts)
+            )
+        else:
+            table = copy_node(table, source=self.default_name)
+        return copy_node(node, table=table)
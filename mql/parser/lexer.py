@@ -1,5 +1,6 @@
 import collections
 import json
+import re
 import string
 
 from mql.common.errors import MqlSyntaxError
@@ -105,6 +106,35 @@ ESCAPED = {
     116: '\t',
 }
 
+KEYWORDS_SET = frozenset(KEYWORDS)
+
+WHITESPACE = frozenset(string.whitespace)
+
+PUNCTUATORS = {chr(code): kind for code, kind in TOKENS_CODE.items()}
+
+ESCAPED_CHARS = {chr(code): value for code, value in ESCAPED.items()}
+
+# character classes used to dispatch scanner on the first char of token
+CHAR_EXPRESSION = 1
+CHAR_STRING = 2
+CHAR_NUMBER = 3
+CHAR_IDENTIFIER = 4
+
+CHAR_CLASSES = dict(
+    [(char, CHAR_EXPRESSION) for char in '!<=>&|'] +
+    [(char, CHAR_STRING) for char in '"'] +
+    [(char, CHAR_NUMBER) for char in '-0123456789'] +
+    [(char, CHAR_IDENTIFIER) for char in string.ascii_letters + '_']
+)
+
+DIGITS = re.compile(r'[0-9]+')
+IDENTIFIER_TAIL = re.compile(r'[a-zA-Z0-9_]*')
+STRING_CHARS = re.compile(r'[^"\\]*')
+
+
+def print_char(char):
+    return print_char_code(ord(char) if char else 0)
+
 
 class Lexer:
     def __init__(self, source):
@@ -125,210 +155,145 @@ class Lexer:
         return token
 
     def next(self):
-        self._skip_whitespace()
-
-        if self._is_eof():
-            return self._eof()
-
-        code = self._current_char_code()
-        kind = TOKENS_CODE.get(code, None)
+        source = self.source
+        length = self.length
+        position = self.position
+        while position < length and source[position] in WHITESPACE:
+            position += 1
+        self.position = position
+
+        if position >= length:
+            return EOFToken(position, position)
+
+        char = source[position]
+        kind = PUNCTUATORS.get(char)
         if kind:
-            self.position += 1
-            return Token(
-                kind, self.position - 1, self.position - 1, chr(code)
-            )
-        #            !   <   =   >   &   |
-        if code in (33, 60, 61, 62, 38, 124):
+            self.position = position + 1
+            return Token(kind, position, position, char)
+
+        char_class = CHAR_CLASSES.get(char)
+        if char_class == CHAR_IDENTIFIER:  # [_a-zA-Z][_a-zA-Z0-9]*
+            end = IDENTIFIER_TAIL.match(source, position + 1).end()
+            self.position = end
+            value = source[position:end]
+            if end - position > 1 and value.upper() in KEYWORDS_SET:
+                return Token(Tokens.KEYWORD, position, end - 1, value)
+            return Token(Tokens.IDENTIFIER, position, end - 1, value)
+        if char_class == CHAR_EXPRESSION:
             return self._scan_expression()
-
-        if code == 34:  # "
-            return self._scan_string()
-        if code == 45 or 48 <= code <= 57:  # [-0-9]
+        if char_class == CHAR_NUMBER:
             return self._scan_number()
-        if 65 <= code <= 90 or code == 95 or 97 <= code <= 122:  # [a-zA-Z_]
-            return self._scan_identifier()
+        if char_class == CHAR_STRING:
+            return self._scan_string()
 
-        self.position = self.length
+        self.position = length
         raise MqlSyntaxError(
-            'Invalid character: {}'.format(print_char_code(code)),
-            self.source, self.position
+            'Invalid character: {}'.format(print_char(char)),
+            source, self.position
         )
 
     def _scan_expression(self):
-        #  !   <   =   >   &   |
-        # 33, 60, 61, 62, 38, 124
-        code = self._current_char_code()
+        source = self.source
         start = self.position
-        if code in (38, 61, 124):
-            expr = self.source[start]
-            self._move_to_next()
-            return Token(Tokens.EXPRESSION, start, start, expr)
-
-        next_code = self._next_char_code()
-        if code == 33:
-            if next_code == 61:
-                self._move_to_next(2)
-                return Token(Tokens.EXPRESSION, start, start+1, '!=')
-        elif code in (60, 62):
-            if next_code == 61:
-                self._move_to_next()
-            position = self.position
-            expr = self.source[start:position+1]
-            self._move_to_next()
-            return Token(Tokens.EXPRESSION, start, position, expr)
+        char = source[start]
+        if char in '&=|':
+            self.position = start + 1
+            return Token(Tokens.EXPRESSION, start, start, char)
+
+        next_char = source[start + 1:start + 2]
+        if char == '!':
+            if next_char == '=':
+                self.position = start + 2
+                return Token(Tokens.EXPRESSION, start, start + 1, '!=')
+        else:  # < >
+            if next_char == '=':
+                self.position = start + 2
+                return Token(Tokens.EXPRESSION, start, start + 1, char + '=')
+            self.position = start + 1
+            return Token(Tokens.EXPRESSION, start, start, char)
 
         raise MqlSyntaxError(
-            'Invalid character: {}'.format(print_char_code(code)),
-            self.source, self.position-1
+            'Invalid character: {}'.format(print_char(char)),
+            source, start - 1
         )
 
     def _scan_number(self):
         '''
         Int:   -?(0|[1-9][0-9]*)
-        Float: -?(0|[1-9][0-9]*)(\.[0-9]+)?((E|e)(+|-)?[0-9]+)?
+        Float: -?(0|[1-9][0-9]*)(\\.[0-9]+)?
         '''
-        start = self.position
-        is_float = False
-        code = self._current_char_code()
+        source = self.source
+        start = position = self.position
 
-        if code == 45:  # -
-            self.position += 1
-            code = self._current_char_code()
+        if source[position] == '-':
+            position += 1
 
-        if code == 48:  # 0
-            self.position += 1
-            code = self._current_char_code()
-            if code and 48 <= code <= 57:
+        if source[position:position + 1] == '0':
+            position += 1
+            char = source[position:position + 1]
+            if char and char in '0123456789':
                 self.position = self.length
                 raise MqlSyntaxError(
-                    'Invalid number after 0: {}'.format(print_char_code(code)),
-                    self.source, self.position
+                    'Invalid number after 0: {}'.format(print_char(char)),
+                    source, self.position
                 )
         else:
-            self._scan_int()
-            code = self._current_char_code()
+            position = self._scan_int(position)
 
-        if code == 46:  # .
-            is_float = True
-            self.position += 1
-            self._scan_int()
-            code = self._current_char_code()
-
-        number = self.source[start:self.position]
+        is_float = source[position:position + 1] == '.'
+        if is_float:
+            position = self._scan_int(position + 1)
 
+        self.position = position
         return NumberToken(
             Tokens.FLOAT if is_float else Tokens.INT,
-            start, self.position-1, number
+            start, position - 1, source[start:position]
         )
 
-    def _scan_int(self):
-        code = self._current_char_code()
-        if code is not None and 48 <= code <= 57:
-            while self.position < self.length:
-                self.position += 1
-                code = self._current_char_code()
-                if not (code is not None and 48 <= code <= 57):
-                    break
-        else:
-            scode = print_char_code(code)
-            raise MqlSyntaxError(
-                'Invalid number. Expected digit but got: {}'.format(scode),
-                self.source, self.position
-            )
+    def _scan_int(self, position):
+        match = DIGITS.match(self.source, position)
+        if match:
+            return match.end()
+        self.position = position
+        char = self.source[position:position + 1]
+        raise MqlSyntaxError(
+            'Invalid number. Expected digit but got: {}'.format(
+                print_char(char)),
+            self.source, position
+        )
 
     def _scan_string(self):
-
-        self.position += 1  # fist char: "
-        start = self.position
-        code = self._current_char_code()
+        source = self.source
+        length = self.length
+        start = position = self.position + 1  # fist char: "
+        escaped = None
         value = []
 
-        while self.position < self.length:
-            code = self._current_char_code()
-            if code == 34:  # quote: "
-                break
-            self.position += 1
-            if code == 92:  # \
-                value.append(self.source[start:self.position-1])
-
-                code = self._current_char_code()
-                escaped = ESCAPED.get(code)
-                if escaped:
-                    value.append(escaped)
-                else:
-                    raise MqlSyntaxError(
-                        'Invalid escape character: \\{}'.format(
-                            print_char_code(code)),
-                        self.source, self.position
-                    )
-                self.position += 1
-                start = self.position
-
-        if code != 34:  # quote: "
-            raise MqlSyntaxError('Unterminated string',
-                                 self.source, self.position)
-        value.append(self.source[start:self.position])
-
-        self.position += 1
-        return StringToken(start, self.position-1, ''.join(value))
-
-    def _read_identifier(self):
-        '''Reads an alphanumeric and underscore chars for keyword
-            [_a-zA-Z][_a-zA-Z0-9]
-        '''
-        first = True
-        start = self.position
-        while self.position < self.length:
-            code = self._current_char_code()
-            if not (code and code == 95 or  # _
-                    65 <= code <= 90 or  # A-Z
-                    97 <= code <= 122 or  # a-z
-                    (48 <= code <= 57 and not first)):  # 0-9
-                break
-            first = False
-            self._move_to_next()
-        value = self.source[start:self.position]
-        return start, self.position - 1, value
-
-    def _scan_identifier(self):
-        start, stop, value = self._read_identifier()
-        if len(value) == 1:
-            return IdentifierToken(start, stop, value)
-        if value.upper() in KEYWORDS:
-            return KeywordToken(start, stop, value)
-        return IdentifierToken(start, stop, value)
-
-    def _skip_whitespace(self):
-        find = False
-        while self.position < self.length:
-            char = self._current_char()
-            if char in string.whitespace:
-                self.position += 1
-                find = True
-            else:
+        while True:
+            position = STRING_CHARS.match(source, position).end()
+            if position >= length:
+                # an escaped quote just before the end closes the string
+                if escaped == '"' and position == start:
+                    break
+                self.position = length
+                raise MqlSyntaxError('Unterminated string', source, length)
+            if source[position] == '"':
                 break
-        return find
-
-    def _move_to_next(self, offset=1):
-        self.position += offset
-
-    def _current_char(self):
-        try:
-            return self.source[self.position]
-        except IndexError:
-            return ''
 
-    def _next_char_code(self, offset=1):
-        try:
-            return ord(self.source[self.position + offset])
-        except IndexError:
-            return 0
-
-    def _current_char_code(self):
-        return self._next_char_code(0)
-
-    def _is_eof(self):
-        return self.position >= self.length
+            value.append(source[start:position])  # \
+            position += 1
+            char = source[position:position + 1]
+            escaped = ESCAPED_CHARS.get(char)
+            if not escaped:
+                self.position = position
+                raise MqlSyntaxError(
+                    'Invalid escape character: \\{}'.format(print_char(char)),
+                    source, position
+                )
+            value.append(escaped)
+            position += 1
+            start = position
 
-    def _eof(self):
-        return EOFToken(self.position, self.position)
+        value.append(source[start:position])
+        self.position = position + 1
+        return StringToken(start, position, ''.join(value))
@@ -1,3 +1,5 @@
+import collections
+
 from mql.common import ast
 from mql.common.errors import MqlSyntaxError
 
@@ -5,19 +7,34 @@ from .consts import OPERATORS, STATEMENTS_KEYWORDS
 from .lexer import Lexer, Tokens, type_to_name
 
 
-def parse(source):
-    parser = Parser(source)
-    return parse_statement(parser)
+Limits = collections.namedtuple(
+    'Limits', ['length', 'depth', 'nodes', 'results'],
+    defaults=(None, None, None, None)
+)
+Limits.__doc__ = '''Query complexity limits, None turns a limit off.
+
+length is the maximum query length in characters, depth the maximum
+expression depth where both operators and parenthesized groups count,
+nodes the maximum number of syntax tree nodes and results the maximum
+number of selected columns. Limits are checked while parsing, so a query
+is rejected as soon as it breaks one of them.
+'''
+
+NO_LIMITS = Limits()
+
+
+def parse(source, limits=None):
+    return parse_statement(Parser(source, limits))
 
 
-def expression(source):
-    parser = Parser(source)
-    return parse_expression(parser)
+def expression(source, limits=None):
+    return parse_expression(Parser(source, limits))
 
 
 class Parser:
-    def __init__(self, source):
+    def __init__(self, source, limits=None):
         self.source = source
+        self.set_limits(limits)
         self.lexer = Lexer(source)
         self.current = None
         self.lookahead = None
@@ -34,6 +51,25 @@ class Parser:
         msg = 'Unexpected token {}'.format(token)
         raise MqlSyntaxError(msg, self.source, token.start)
 
+    def set_limits(self, limits):
+        self.limits = limits = limits or NO_LIMITS
+        self.nodes = 0
+        if limits.length is not None and len(self.source) > limits.length:
+            msg = 'Query is too long, limit is {}'.format(limits.length)
+            raise MqlSyntaxError(msg, self.source, limits.length)
+
+    def raise_limit(self, msg, limit):
+        current = self.current
+        position = current.start if current else None
+        msg = '{}, limit is {}'.format(msg, limit)
+        raise MqlSyntaxError(msg, self.source, position)
+
+    def add_nodes(self, count=1):
+        self.nodes += count
+        limit = self.limits.nodes
+        if limit is not None and self.nodes > limit:
+            self.raise_limit('Query has too many nodes', limit)
+
     def next(self):
         self.current = self.lookahead
         self.lookahead = self.lexer.next()
@@ -110,71 +146,151 @@ def get_operator_precedence(token):
     return OPERATORS[token.value.upper()]
 
 
-def parse_expression(parser):
-    left = parse_expression_token(parser)
-    if not left:
-        raise MqlSyntaxError('Empty expression', parser.source)
-    if not parser.match_type(Tokens.EXPRESSION) and not parser.match_keyword('AND') and not parser.match_keyword('OR'):
-        return left
-    operator = parser.next()
-    right = parse_expression_token_right(parser)
-    if not right:
-        msg = 'Expected expression after {}'.format(operator)
-        raise MqlSyntaxError(msg, parser.source)
-    stack = [left, operator, right]
-
-    while parser.match_type(Tokens.EXPRESSION) or parser.match_keyword('AND') or parser.match_keyword('OR'):
-        operator = parser.next()
-        precedence = get_operator_precedence(operator)
-        while len(stack) > 2 and precedence <= get_operator_precedence(stack[-2]):
-            right = stack.pop()
-            op = stack.pop()
-            left = stack.pop()
-            stack.append(create_binary_expression(op.value, left, right))
-        node = parse_expression_token_right(parser)
-        if not node:
-            msg = 'Expected expression after {}'.format(operator)
-            raise MqlSyntaxError(msg, parser.source)
-        stack.append(operator)
-        stack.append(node)
-    i = len(stack) - 1
-    node = stack[i]
-    while i > 1:  # roll up
-        operator = stack[i - 1]
-        left = stack[i - 2]
-        node = create_binary_expression(operator.value, left, node)
-        i -= 2
-    return node
+# operand positions
+FIRST_OPERAND = 1  # after "(" and at the start of expression
+RIGHT_OPERAND = 2  # after operator
 
+LOGICAL_OPERATORS = frozenset(['AND', 'OR'])
 
-def create_binary_expression(operator, left, right):
-    if operator in ['AND', 'OR']:
-        return ast.LogicalExpression(operator, left, right)
-    return ast.BinaryExpression(operator, left, right)
 
+def parse_expression(parser):
+    '''Parse expression with precedence climbing.
+
+    Nested groups are kept on an explicit stack of frames instead of the
+    call stack, so nesting depth is not limited by the recursion limit.
+    Operators of the same precedence are left associative. Depth of every
+    operand is tracked next to it to enforce the depth limit.
+
+    The lookahead token is read once per step and operators are reduced
+    inline, which keeps long flat expressions as fast as with the former
+    recursive parser.
+    '''
+    limits = parser.limits
+    max_depth = limits.depth
+    count_nodes = limits.nodes is not None
+    frames = []
+    operands = []
+    depths = []
+    operators = []
+    position = FIRST_OPERAND
+    while True:
+        token = parser.lookahead
+        type_ = token.type
+        wrap = None
+        depth = 1
+        if type_ == Tokens.PAREN_LEFT:
+            node = None
+        elif type_ == Tokens.IDENTIFIER:
+            parser.next()
+            node = ast.Identifier(token.value)
+        elif position == FIRST_OPERAND:
+            raise MqlSyntaxError('Empty expression', parser.source)
+        elif type_ == Tokens.QUESTION:
+            parser.next()
+            node = ast.Placeholder()
+        elif type_ == Tokens.INT:
+            parser.next()
+            node = ast.IntNumber(token.value)
+        elif type_ == Tokens.STRING:
+            parser.next()
+            node = ast.String(token.value)
+        elif parser.match_keyword('NOT'):
+            parser.next()
+            wrap = ast.UnaryExpression
+            node = None
+            if parser.match_type(Tokens.IDENTIFIER):
+                node = wrap(ast.Identifier(parser.next().value))
+                depth = 2
+                parser.add_nodes()
+            elif not parser.match_type(Tokens.PAREN_LEFT):
+                node = wrap(None)
+        else:
+            raise MqlSyntaxError('Not found right expression', parser.source)
+
+        if node is None:  # open group
+            parser.expect_type(Tokens.PAREN_LEFT)
+            frames.append((operands, depths, operators, wrap))
+            if max_depth is not None and len(frames) > max_depth:
+                parser.raise_limit('Expression is too deep', max_depth)
+            operands = []
+            depths = []
+            operators = []
+            position = FIRST_OPERAND
+            continue
+
+        if count_nodes:
+            parser.add_nodes()
+        operands.append(node)
+        depths.append(depth)
+        token = parser.lookahead
+        while not is_operator(token):
+            node, depth = reduce_expression(
+                parser, operands, operators, depths
+            )
+            if not frames:
+                return node
+            parser.expect_type(Tokens.PAREN_RIGHT)
+            operands, depths, operators, wrap = frames.pop()
+            if wrap:
+                node = wrap(node)
+                depth = check_depth(parser, depth + 1)
+                parser.add_nodes()
+            operands.append(node)
+            depths.append(depth)
+            token = parser.lookahead
 
-def parse_expression_token(parser):
-    if parser.match_type(Tokens.PAREN_LEFT):
-        return parse_expression_group(parser)
-    if parser.match_type(Tokens.IDENTIFIER):
-        return ast.Identifier(parser.next().value)
-
+        parser.next()
+        precedence = OPERATORS[token.value.upper()]
+        while operators and precedence <= operators[-1][0]:
+            right = operands.pop()
+            left = operands.pop()
+            depth = max(depths.pop(), depths.pop()) + 1
+            if max_depth is not None and depth > max_depth:
+                parser.raise_limit('Expression is too deep', max_depth)
+            if count_nodes:
+                parser.add_nodes()
+            operands.append(create_binary_expression(
+                operators.pop()[1].value, left, right
+            ))
+            depths.append(depth)
+        operators.append((precedence, token))
+        position = RIGHT_OPERAND
+
+
+def is_operator(token):
+    type_ = token.type
+    return type_ == Tokens.EXPRESSION or type_ == Tokens.KEYWORD and \
+        token.value.upper() in LOGICAL_OPERATORS
+
+
+def reduce_expression(parser, operands, operators, depths):
+    max_depth = parser.limits.depth
+    count_nodes = parser.limits.nodes is not None
+    node = operands.pop()
+    depth = depths.pop()
+    while operators:
+        depth = max(depth, depths.pop()) + 1
+        if max_depth is not None and depth > max_depth:
+            parser.raise_limit('Expression is too deep', max_depth)
+        if count_nodes:
+            parser.add_nodes()
+        node = create_binary_expression(
+            operators.pop()[1].value, operands.pop(), node
+        )
+    return node, depth
 
-def parse_expression_token_right(parser):
-    if parser.match_type(Tokens.PAREN_LEFT):
-        return parse_expression_group(parser)
 
-    value = parse_value(parser)
-    if value:
-        return value
+def check_depth(parser, depth):
+    limit = parser.limits.depth
+    if limit is not None and depth > limit:
+        parser.raise_limit('Expression is too deep', limit)
+    return depth
 
-    if parser.match_type(Tokens.IDENTIFIER):
-        return ast.Identifier(parser.next().value)
 
-    if parser.match_keyword('NOT'):
-        parser.next()
-        return ast.UnaryExpression(parse_expression_token(parser))
-    raise MqlSyntaxError('Not found right expression', parser.source)
+def create_binary_expression(operator, left, right):
+    if operator in ['AND', 'OR']:
+        return ast.LogicalExpression(operator, left, right)
+    return ast.BinaryExpression(operator, left, right)
 
 
 def parse_value(parser):
@@ -191,13 +307,6 @@ def parse_value(parser):
     return None
 
 
-def parse_expression_group(parser):
-    parser.expect_type(Tokens.PAREN_LEFT)
-    node = parse_expression(parser)
-    parser.expect_type(Tokens.PAREN_RIGHT)
-    return node
-
-
 def parse_expression_identifier(parser):
     token = parser.expect_types(Tokens.IDENTIFIER)
     return ast.Identifier(token.value)
@@ -249,13 +358,25 @@ def parse_show(parser):
         return ast.ShowSourcesStatement()
     if name == 'SOURCE':
         value = parse_identifier_name(parser)
-        return ast.ShowSourceStatement(ast.Source(value))
+        stmt = ast.ShowSourceStatement(ast.Source(value))
+        # LIKE is not reserved, it is matched only here
+        if parser.match_identifier() and \
+                parser.lookahead.value.upper() == 'LIKE':
+            parser.next()
+            stmt.pattern = parser.expect_type(Tokens.STRING).value
+        if parser.match_keyword('LIMIT'):
+            stmt.limit = parse_select_limit(parser).value
+        if parser.match_keyword('OFFSET'):
+            stmt.offset = parse_select_offset(parser).value
+        parser.expect_type(Tokens.EOF)
+        return stmt
     msg = 'Unknow show statement: {}'.format(name)
     raise MqlSyntaxError(msg, parser.source, token.start)
 
 
 def parse_select(parser):
     stmt = ast.SelectStatement()
+    parser.add_nodes()
     stmt.results = parse_select_results(parser)
     stmt.table = parse_select_table(parser)
     if not parser.match_type(Tokens.EOF):
@@ -283,14 +404,18 @@ def parse_identifier_name(parser):
 
 
 def parse_select_results(parser):
+    max_results = parser.limits.results
     results = [parse_select_identifier(parser)]
     while parser.match_type(Tokens.COMA):
+        if max_results is not None and len(results) >= max_results:
+            parser.raise_limit('Too many result columns', max_results)
         parser.next()
         results.append(parse_select_identifier(parser))
     return results
 
 
 def parse_select_identifier(parser):
+    parser.add_nodes()
     if parser.match_type(Tokens.WILDCARD):
         token = parser.next()
         return ast.SelectIdentifier(token.value)
@@ -306,11 +431,13 @@ def parse_select_identifier(parser):
 def parse_select_table(parser):
     parser.expect_keyword('FROM')
     name = parse_identifier_name(parser)
+    parser.add_nodes()
     return ast.SelectTable(name)
 
 
 def parse_select_where(parser):
     parser.expect_keyword('WHERE')
+    parser.add_nodes()
     return ast.SelectWhere(parse_expression(parser))
 
 
@@ -320,6 +447,7 @@ def parse_select_order(parser):
         parser.next()
 
     order = ast.SelectOrder()
+    parser.add_nodes()
     order.add(parse_select_order_item(parser))
 
     while parser.match_type(Tokens.COMA):
@@ -330,6 +458,7 @@ def parse_select_order(parser):
 
 def parse_select_order_item(parser):
     token = parser.expect_identifier()
+    parser.add_nodes()
     direction = None
     if parser.match_keyword('ASC') or parser.match_keyword('DESC'):
         direction = parser.next().value
@@ -339,18 +468,21 @@ def parse_select_order_item(parser):
 def parse_select_limit(parser):
     parser.expect_keyword('LIMIT')
     value = parser.expect_type(Tokens.INT).value
+    parser.add_nodes()
     return ast.SelectLimit(value)
 
 
 def parse_select_offset(parser):
     parser.expect_keyword('OFFSET')
     value = parser.expect_type(Tokens.INT).value
+    parser.add_nodes()
     return ast.SelectOffset(value)
 
 
 def parse_insert(parser):
     parser.expect_keyword('INTO')
     table = ast.InsertTable(parse_identifier_name(parser))
+    parser.add_nodes(2)
     ids = parse_insert_results(parser)
     values = parse_insert_values(parser)
     if len(ids) != len(values):
@@ -364,9 +496,11 @@ def parse_insert(parser):
 def parse_insert_results(parser):
     parser.expect_type(Tokens.PAREN_LEFT)
     ids = [ast.Identifier(parser.expect_identifier().value)]
+    parser.add_nodes()
     while parser.match_type(Tokens.COMA):
         parser.next()
         ids.append(ast.Identifier(parser.expect_identifier().value))
+        parser.add_nodes()
     parser.expect_type(Tokens.PAREN_RIGHT)
     return ids
 
@@ -380,6 +514,7 @@ def parse_insert_values(parser):
         if not value:
             raise MqlSyntaxError(
                 'Incorrect update column value', parser.source)
+        parser.add_nodes()
         values.append(value)
         if not parser.match_type(Tokens.COMA):
             break
@@ -390,6 +525,7 @@ def parse_insert_values(parser):
 
 def parse_update(parser):
     table_name = ast.UpdateTable(parse_identifier_name(parser))
+    parser.add_nodes(2)
     columns = parse_update_columns(parser)
     parser.expect_keyword('WHERE')
     where = parse_expression(parser)
@@ -408,6 +544,7 @@ def parse_update_columns(parser):
             raise MqlSyntaxError(
                 'Incorrect update column value', parser.source)
 
+        parser.add_nodes(2)
         columns.append(ast.UpdateColumn(name, value))
         if not parser.match_type(Tokens.COMA):
             break
@@ -418,6 +555,7 @@ def parse_update_columns(parser):
 def parse_delete(parser):
     parser.expect_keyword('FROM')
     table_name = ast.DeleteTable(parse_identifier_name(parser))
+    parser.add_nodes(2)
     parser.expect_keyword('WHERE')
     where = parse_expression(parser)
     parser.expect_type(Tokens.EOF)
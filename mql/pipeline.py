@@ -0,0 +1,151 @@
+import collections
+
+from mql.common import ast, errors
+from mql.common.params import ParamsBinder
+from mql.common.traverse import IterativeVisitor, NodeWalkers
+from mql.common.views import ListView
+from mql.validation import ValidatorContext, validation_key
+from mql.validation.rules import default_rules
+
+__all__ = ['Pipeline', 'PipelineResult']
+
+
+PipelineResult = collections.namedtuple(
+    'PipelineResult',
+    ['ast_document', 'source', 'statement', 'binder', 'errors']
+)
+
+
+class Pipeline:
+    '''Transform, validate and generate SQL in a single traversal.
+
+    The SQL generator of the source drives the traversal and every node it
+    visits first goes through transformers and then validation rules.
+    Transformers take part only through their visit_<Class> handlers which
+    must return the node to use in place of the given one without visiting
+    its children. The replacement is used for the rest of the pipeline, the
+    parent node is not changed.
+    '''
+
+    def __init__(self, transformers, rules=None, parametrizer=None,
+                 cache=None):
+        self._transformers = _Hooks(transformers)
+        self._parametrizer = _Hooks([parametrizer] if parametrizer else [])
+        self._rules = rules or default_rules
+        self._cache = cache
+
+    def clear(self):
+        self._transformers.clear()
+        self._parametrizer.clear()
+
+    def resolve(self, ast_document, find_source):
+        '''Transform root node and return it with its source.'''
+        root = self._transformers.apply(ast_document)
+        return root, find_source(root)
+
+    def run(self, root, source, params):
+        '''Validate and generate resolved document, see resolve.
+
+        With cache, known invalid documents are rejected without traversal
+        and rules are skipped for known valid ones.
+        '''
+        rules = self._rules
+        cache = self._cache
+        if cache is not None:
+            key = validation_key(source.schema, root, params, rules)
+            errors_ = cache.get(key)
+            if errors_:
+                return PipelineResult(root, source, None, None, list(errors_))
+            if errors_ is not None:
+                rules = ()
+        context = ValidatorContext(source.schema, root, params)
+        walkers = NodeWalkers([rule(context) for rule in rules])
+
+        executor = getattr(source, 'executor', None)
+        create_generator = getattr(executor, 'create_generator', None)
+        generator = create_generator() if create_generator \
+            else IterativeVisitor()
+        visitor = _PipelineVisitor(self, walkers, generator)
+        visitor.run(root)
+
+        errors_ = context.get_errors()
+        if cache is not None and rules:
+            cache.put(key, tuple(errors_))
+        if errors_:
+            return PipelineResult(root, source, None, None, errors_)
+        statement = executor.statement(generator) if create_generator \
+            else None
+        binder = None
+        if self._parametrizer:
+            binder = ParamsBinder(placeholders=visitor.placeholders)
+        return PipelineResult(root, source, statement, binder, None)
+
+
+class _Hooks:
+    '''Node local visit_<Class> handlers of transformers.'''
+
+    def __init__(self, transformers):
+        self._transformers = transformers
+        self._handlers = {}
+
+    def __bool__(self):
+        return bool(self._transformers)
+
+    def clear(self):
+        self._handlers.clear()
+
+    def apply(self, node):
+        node_class = node.__class__
+        try:
+            handlers = self._handlers[node_class]
+        except KeyError:
+            handlers = self._find_handlers(node_class)
+        for transformer, handler in handlers:
+            node = handler(transformer, node)
+            if not isinstance(node, ast.Node):
+                raise errors.MqlError(
+                    'Pipeline transformer must return node, got: {}'.format(
+                        repr(node)))
+        return node
+
+    def _find_handlers(self, node_class):
+        method = 'visit_' + node_class.__name__
+        handlers = []
+        for transformer in self._transformers:
+            handler = getattr(transformer.__class__, method, None)
+            if handler:
+                handlers.append((transformer, handler))
+        self._handlers[node_class] = handlers
+        return handlers
+
+
+class _PipelineVisitor:
+    def __init__(self, pipeline, walkers, generator):
+        self._transformers = pipeline._transformers
+        self._parametrizer = pipeline._parametrizer
+        self._walkers = walkers
+        self._generator = generator
+        self._ancestors = []
+        self._path = ListView(self._ancestors)
+        self.placeholders = []
+
+    def run(self, root):
+        self._generator.visit(root, self._enter, self._leave)
+
+    def _enter(self, node):
+        ancestors = self._ancestors
+        if ancestors:
+            # root is transformed by Pipeline.resolve already
+            node = self._transformers.apply(node)
+            parent = ancestors[-1]
+        else:
+            parent = None
+        self._walkers.visit(node, parent, self._path)
+        node = self._parametrizer.apply(node)
+        if isinstance(node, ast.Placeholder):
+            self.placeholders.append(node)
+        ancestors.append(node)
+        return node
+
+    def _leave(self, node):
+        self._ancestors.pop()
@@ -1,13 +1,42 @@
+from mql.common.params import params_types
 from mql.common.traverse import walk, NodeWalkers
 from .rules import default_rules
 
 
-def validate(schema, ast_document, params, rules=None):
+def validate(schema, ast_document, params, rules=None, cache=None):
+    '''Return errors of document, the list is empty when it is valid.
+
+    With cache (see LRUCache) outcomes are kept by validation_key, rules
+    do not run again for a document of the same structure until schema is
+    replaced. Warnings are reported only when rules run.
+    '''
     rules = rules or default_rules
+    if cache is not None:
+        key = validation_key(schema, ast_document, params, rules)
+        errors = cache.get(key)
+        if errors is not None:
+            return list(errors)
     context = ValidatorContext(schema, ast_document, params)
     walkers = [rule(context) for rule in rules]
     walk(ast_document, NodeWalkers(walkers))
-    return context.get_errors()
+    errors = context.get_errors()
+    if cache is not None:
+        cache.put(key, tuple(errors))
+    return errors
+
+
+def validation_key(schema, ast_document, params, rules):
+    '''Return key of validation outcome.
+
+    Documents are compared by structure, literal values included since
+    rules may check them. Lazy schemas gain tables as queries load them
+    while keeping their version, so their count of loads is part of the
+    key.
+    '''
+    return (
+        ast_document, getattr(schema, 'version', None),
+        params_types(params), tuple(rules), getattr(schema, 'loads', None)
+    )
 
 
 class ValidatorContext(object):
@@ -16,9 +45,16 @@ class ValidatorContext(object):
         self.ast_document = ast_document
         self.params = params
         self._errors = []
+        self._warnings = []
 
     def add_error(self, error):
         self._errors.append(error)
 
     def get_errors(self):
         return self._errors[:]
+
+    def add_warning(self, warning):
+        self._warnings.append(warning)
+
+    def get_warnings(self):
+        return self._warnings[:]
@@ -1,3 +1,4 @@
+from .cost_guard import CostGuardRule
 from .select_unique_results import SelectUniqueResultsRule
 
 
@@ -5,4 +6,4 @@ default_rules = [
     SelectUniqueResultsRule
 ]
 
-__all__ = ['SelectUniqueResultsRule']
+__all__ = ['CostGuardRule', 'SelectUniqueResultsRule']
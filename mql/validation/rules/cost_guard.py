@@ -0,0 +1,152 @@
+import functools
+import logging
+
+from mql.common import ast
+from .base import BaseRule
+
+logger = logging.getLogger(__name__)
+
+# operators which can use a btree index on column
+INDEX_OPERATORS = frozenset(['=', '<', '>', '<=', '>='])
+
+
+class CostGuardRule(BaseRule):
+    '''Guard large tables against expensive statements.
+
+    Uses planner estimates and index metadata of the schema, tables with
+    unknown size are not checked. A statement over a table with more than
+    max_rows rows is reported when its filter can not use an index, a
+    select is reported too when it has no LIMIT and require_limit is set,
+    unless its filter matches a unique index by equality and so returns
+    one row at most. A select with LIMIT and without WHERE and ORDER BY
+    stops early, so its full scan is allowed. Table names without
+    namespace are resolved by the schema, see SourceSchema.find_table.
+    Problems are errors, or warnings with action "warn".
+
+    Use configure to get the rule with other settings.
+    '''
+    max_rows = 100000
+    require_limit = True
+    action = 'error'
+
+    @classmethod
+    @functools.lru_cache(maxsize=32)
+    def configure(cls, max_rows=None, require_limit=None, action=None):
+        '''Return subclass with given settings, the same for same
+        arguments.'''
+        if action not in (None, 'error', 'warn'):
+            raise ValueError('Unknown action: {}'.format(action))
+        attrs = dict(
+            max_rows=cls.max_rows if max_rows is None else max_rows,
+            require_limit=cls.require_limit if require_limit is None
+            else require_limit,
+            action=action or cls.action,
+        )
+        return type(cls.__name__, (cls, ), attrs)
+
+    def visit_SelectStatement(self, node, *args):
+        table = self._get_large_table(node)
+        if table is None:
+            return
+        # a filter may skip most rows before LIMIT is reached
+        limited = node.limit is not None and node.order is None and \
+            node.where is None
+        if not limited and not self._is_indexed(table, node.where):
+            self._scan(table)
+        if self.require_limit and node.limit is None and \
+                not is_unique_search(table, node.where):
+            self._report('Missing LIMIT for table {} with about {} rows'
+                         .format(table.name, table.rows))
+
+    def visit_UpdateStatement(self, node, *args):
+        self._check_where(node)
+
+    def visit_DeleteStatement(self, node, *args):
+        self._check_where(node)
+
+    def _check_where(self, node):
+        table = self._get_large_table(node)
+        if table is not None and not self._is_indexed(table, node.where):
+            self._scan(table)
+
+    def _get_large_table(self, node):
+        find_table = getattr(self.context.schema, 'find_table', None)
+        if find_table is None or node.table is None:
+            return None
+        table = find_table(node.table.name)
+        # negative estimate means table was never analyzed
+        if table is None or table.rows is None or table.rows < 0:
+            return None
+        if table.rows <= self.max_rows:
+            return None
+        return table
+
+    def _is_indexed(self, table, where):
+        '''Whether filter can be answered with indexes of table.'''
+        if isinstance(where, ast.SelectWhere):
+            where = where.condition
+        results = []
+        stack = [(where, False)]
+        while stack:
+            node, reduce = stack.pop()
+            if not isinstance(node, ast.LogicalExpression):
+                results.append(is_index_search(table, node))
+            elif not reduce:
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+            else:
+                right = results.pop()
+                left = results.pop()
+                if node.operator.upper() == 'OR':
+                    # both branches have to use an index
+                    results.append(left and right)
+                else:
+                    results.append(left or right)
+        return results.pop()
+
+    def _scan(self, table):
+        self._report(
+            'Full scan of table {} with about {} rows, '
+            'filter by an indexed column'.format(table.name, table.rows)
+        )
+
+    def _report(self, message):
+        if self.action == 'warn':
+            logger.warning(message)
+            self.context.add_warning(message)
+        else:
+            self.context.add_error(message)
+
+
+def is_unique_search(table, where):
+    '''Whether filter compares columns of a unique index for equality.'''
+    if isinstance(where, ast.SelectWhere):
+        where = where.condition
+    columns = set()
+    stack = [where]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.LogicalExpression):
+            if node.operator.upper() == 'AND':
+                stack.append(node.left)
+                stack.append(node.right)
+        elif isinstance(node, ast.BinaryExpression) and \
+                node.operator == '=':
+            left, right = node.left, node.right
+            if isinstance(right, ast.Identifier):
+                left, right = right, left
+            if isinstance(left, ast.Identifier) and \
+                    not isinstance(right, ast.Identifier):
+                columns.add(left.name)
+    return bool(columns) and table.is_unique(columns)
+
+
+def is_index_search(table, node):
+    if not isinstance(node, ast.BinaryExpression) or \
+            node.operator not in INDEX_OPERATORS:
+        return False
+    return any(
+        isinstance(side, ast.Identifier) and table.is_indexed(side.name)
+        for side in (node.left, node.right)
+    )
@@ -0,0 +1,102 @@
+from mql.common import ast
+from mql.common.params import LiteralTransformer
+from mql.common.traverse import copy_node
+from mql.parser.parser import expression, parse
+
+from .base import create_ast_tree
+
+
+def parametrize(query):
+    return LiteralTransformer().visit(parse(query))
+
+
+def test_equal():
+    assert create_ast_tree() == create_ast_tree()
+    assert hash(create_ast_tree()) == hash(create_ast_tree())
+    assert parse('SELECT a FROM foo') != parse('SELECT b FROM foo')
+    assert ast.IntNumber(1) != ast.FloatNumber(1)
+    assert ast.Identifier('a') != 'a'
+
+
+def test_equal_lists():
+    assert parse('SELECT a, b FROM foo') != parse('SELECT a FROM foo')
+    assert parse('SELECT a, b FROM foo') != parse('SELECT b, a FROM foo')
+
+
+def test_hash_cached():
+    tree = create_ast_tree()
+    value = hash(tree)
+    assert tree._hash == value
+    assert tree.where.condition._hash == hash(tree.where.condition)
+    # copies do not share cached hash
+    copy = copy_node(tree, limit=ast.SelectLimit(20))
+    assert not hasattr(copy, '_hash')
+    assert hash(copy) != value
+
+
+def test_dedupe():
+    queries = [
+        'SELECT a FROM foo WHERE id = 1',
+        'SELECT a FROM foo WHERE id = 1',
+        'SELECT a FROM foo WHERE id = 2',
+    ]
+    assert len({parse(query) for query in queries}) == 2
+
+
+def test_duplicate_subexpressions():
+    expr = expression('(a = 1 OR b = 2) AND (a = 1 OR b = 2)')
+    assert expr.left == expr.right
+    assert expr.left is not expr.right
+
+
+def test_shape_key():
+    key1 = ast.ShapeKey(parametrize('SELECT a FROM foo WHERE id = 1'))
+    key2 = ast.ShapeKey(parametrize('SELECT a FROM foo WHERE id = "2"'))
+    key3 = ast.ShapeKey(parse('SELECT a FROM foo WHERE id = 1'))
+    key4 = ast.ShapeKey(parse('SELECT a FROM foo WHERE id = 2'))
+    key5 = ast.ShapeKey(parse('SELECT a FROM foo WHERE id = ?'))
+    assert key1 == key2
+    assert hash(key1) == hash(key2)
+    assert key3 != key4
+    assert key1 != key5
+    assert len({key1, key2, key3, key4, key5}) == 4
+
+
+def test_structurally_equal_parameters():
+    left = parametrize('SELECT a FROM foo WHERE id = 1')
+    right = parametrize('SELECT a FROM foo WHERE id = 2')
+    assert not ast.structurally_equal(left, right)
+    assert ast.structurally_equal(left, right, parameters=False)
+    assert ast.structural_hash(left, parameters=False) == \
+        ast.structural_hash(right, parameters=False)
+
+
+def test_structurally_equal_literals():
+    left = parse('SELECT a FROM foo WHERE id = 1')
+    right = parse('SELECT a FROM foo WHERE id = 2')
+    assert not ast.structurally_equal(left, right, parameters=False)
+    assert ast.structurally_equal(left, right, literals=False)
+    assert ast.structural_hash(left, literals=False) == \
+        ast.structural_hash(right, literals=False)
+    assert ast.structurally_equal(
+        parametrize('SELECT a FROM foo WHERE id = 1'),
+        parametrize('SELECT a FROM foo WHERE id = 2'), literals=False
+    )
+    assert not ast.structurally_equal(
+        left, parse('SELECT a FROM foo WHERE id = "1"'), literals=False
+    )
+    assert not ast.structurally_equal(
+        left, parse('SELECT a FROM foo WHERE num = 1'), literals=False
+    )
+    assert ast.ShapeKey(left) != ast.ShapeKey(right)
+
+
+def test_shape_key_deep():
+    query = 'SELECT a FROM foo WHERE a = 1' + ' AND a = 1' * 3000
+    assert ast.ShapeKey(parse(query)) == ast.ShapeKey(parse(query))
+
+
+def test_hash_deep():
+    expr = expression('a = 1' + ' AND a = 1' * 5000)
+    assert hash(expr) == hash(expression('a = 1' + ' AND a = 1' * 5000))
+    assert expr == expression('a = 1' + ' AND a = 1' * 5000)
@@ -0,0 +1,57 @@
+from mql.common.cache import LRUCache
+
+
+def test_get_missing():
+    cache = LRUCache(2)
+    assert cache.get('a') is None
+    assert cache.get('a', 1) == 1
+    assert cache.info().misses == 2
+
+
+def test_put_get():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    assert 'a' in cache
+    assert len(cache) == 1
+    info = cache.info()
+    assert info.hits == 1
+    assert info.misses == 0
+    assert info.size == 1
+    assert info.maxsize == 2
+
+
+def test_evict_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert cache.info().evictions == 1
+
+
+def test_disabled():
+    cache = LRUCache(0)
+    cache.put('a', 1)
+    assert len(cache) == 0
+    assert cache.get('a') is None
+
+
+def test_clear():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.discard('b')
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_prune():
+    cache = LRUCache(4)
+    for i in range(4):
+        cache.put(i, i * 10)
+    assert cache.prune(lambda key, value: value >= 20) == 2
+    assert len(cache) == 2
+    assert 0 in cache and 1 in cache
@@ -0,0 +1,81 @@
+import pytest
+
+from mql.common import ast
+from mql.common.errors import MqlError
+from mql.common.params import (LiteralTransformer, ParamsBinder, fingerprint,
+                               shape)
+from mql.parser.parser import parse
+
+
+def parametrize(query):
+    return LiteralTransformer().visit(parse(query))
+
+
+def test_lift_literals():
+    stmt = parametrize('UPDATE foo SET a=1, b="x", c=? WHERE id=2')
+    assert isinstance(stmt.columns[0].value, ast.Parameter)
+    assert stmt.columns[0].value.value == 1
+    assert isinstance(stmt.columns[1].value, ast.Parameter)
+    assert stmt.columns[1].value.value == 'x'
+    assert not isinstance(stmt.columns[2].value, ast.Parameter)
+    assert isinstance(stmt.where.right, ast.Parameter)
+
+
+def test_bind_params():
+    stmt = parametrize('UPDATE foo SET a=1, b=? WHERE id=?')
+    binder = ParamsBinder(stmt)
+    assert binder.bind(['b', 5]) == [1, 'b', 5]
+
+
+def test_bind_without_literals():
+    binder = ParamsBinder(parametrize('SELECT * FROM foo WHERE id=?'))
+    params = [1]
+    assert binder.bind(params) is params
+
+
+def test_bind_missing_params():
+    binder = ParamsBinder(parametrize('UPDATE foo SET a=1 WHERE id=?'))
+    with pytest.raises(MqlError):
+        binder.bind([])
+
+
+def test_fingerprint_ignores_parameters():
+    a = fingerprint(parametrize('SELECT * FROM foo WHERE id = 17'))
+    b = fingerprint(parametrize('SELECT * FROM foo WHERE id = 18'))
+    c = fingerprint(parametrize('SELECT * FROM foo WHERE id = "18"'))
+    assert a == b == c
+
+
+def test_fingerprint_literals():
+    a = fingerprint(parse('SELECT * FROM foo WHERE id = 17'))
+    b = fingerprint(parse('SELECT * FROM foo WHERE id = 18'))
+    assert a != b
+
+
+def test_fingerprint_shape():
+    a = fingerprint(parse('SELECT * FROM foo WHERE id = ?'))
+    b = fingerprint(parse('SELECT * FROM foo WHERE id > ?'))
+    c = fingerprint(parse('SELECT * FROM foo WHERE id = ? LIMIT 1'))
+    assert len({a, b, c}) == 3
+
+
+def test_shape_ignores_parameters():
+    a = shape(parametrize('SELECT * FROM foo WHERE id = 17'))
+    b = shape(parametrize('SELECT * FROM foo WHERE id = "18"'))
+    c = shape(parse('SELECT * FROM foo WHERE id = 17'))
+    d = shape(parse('SELECT * FROM foo WHERE id = 18'))
+    assert a == b
+    assert hash(a) == hash(b)
+    assert len({a, c, d}) == 3
+
+
+def test_shape_deep():
+    query = 'SELECT * FROM foo WHERE id = 1' + ' AND id = 1' * 3000
+    assert shape(parse(query)) == shape(parse(query))
+    assert fingerprint(parse(query)) == fingerprint(parse(query))
+
+
+def test_fingerprint_structure():
+    a = fingerprint(parse('SELECT a, b FROM foo'))
+    b = fingerprint(parse('SELECT a FROM foo'))
+    assert a != b
@@ -1,4 +1,8 @@
+import asyncio
+import json
+
 from mql.common import schema
+from mql.parser.parser import parse
 
 
 def test_simple_source():
@@ -47,3 +51,138 @@ def test_add_column_to_table():
     assert data['length'] == -1
     assert data['enum'] == []
     assert data['is_primary'] == False
+
+
+def create_lazy_schema():
+    calls = []
+
+    async def loader(names):
+        calls.append(list(names))
+        await asyncio.sleep(0)
+        return [schema.Table(name) for name in names]
+
+    db = schema.LazySourceSchema('db', ['public.foo', 'public.bar'], loader)
+    return db, calls
+
+
+def test_lazy_source():
+    db, calls = create_lazy_schema()
+    assert db.table_names == ['public.foo', 'public.bar']
+    assert db.get_table('public.foo') is None
+    assert db.serialize()['tables'] == [
+        {'name': 'public.foo'}, {'name': 'public.bar'}
+    ]
+    assert db.loads == 0
+    asyncio.run(db.load_tables(['public.foo', 'public.missing']))
+    assert calls == [['public.foo']]
+    assert db.get_table('public.foo').name == 'public.foo'
+    assert db.serialize()['tables'][0]['columns'] == []
+    assert db.loads == 1
+    asyncio.run(db.load_tables(['public.foo']))
+    assert calls == [['public.foo']]
+    assert db.loads == 1
+
+
+def test_lazy_source_concurrent():
+    db, calls = create_lazy_schema()
+
+    async def load():
+        await asyncio.gather(
+            db.load_tables(['public.foo']),
+            db.load_tables(['public.foo', 'public.bar']),
+        )
+
+    asyncio.run(load())
+    assert calls == [['public.foo'], ['public.bar']]
+    assert len(db.tables) == 2
+
+
+def test_lazy_source_missing_tables():
+    db, _ = create_lazy_schema()
+    assert db.missing_tables(parse('SELECT * FROM public.foo')) == \
+        ['public.foo']
+    assert db.missing_tables(parse('SELECT * FROM other')) == []
+    assert db.missing_tables(parse('SHOW SOURCES')) == []
+
+
+def test_get_table():
+    db = schema.SourceSchema('db')
+    foo = schema.Table('public.foo')
+    db.add_table(foo)
+    assert db.get_table('public.foo') is foo
+    assert db.get_table('public.bar') is None
+
+
+def test_get_column():
+    table = schema.Table('public.foo')
+    column = schema.Column('id', 'integer')
+    table.add_column(column)
+    assert table.get_column('id') is column
+    assert table.get_column('name') is None
+
+
+def test_read_only_views():
+    db = schema.SourceSchema('db')
+    tables = db.tables
+    assert tables is db.tables
+    db.add_table(schema.Table('public.foo'))
+    assert len(tables) == 1
+    assert not hasattr(tables, 'append')
+    table = tables[0]
+    assert table.columns is table.columns
+    assert not hasattr(table.constraints, 'append')
+
+
+def test_slots():
+    for item in (schema.SourceSchema('db'), schema.Table('foo'),
+                 schema.Column('id', 'integer')):
+        assert not hasattr(item, '__dict__')
+
+
+def create_tables_schema():
+    db = schema.SourceSchema('db')
+    for name in ('public.foo', 'public.bar', 'audit.log', 'public.baz'):
+        db.add_table(schema.Table(name))
+    return db
+
+
+def test_serialize_cached():
+    db = create_tables_schema()
+    data = db.serialize()
+    assert db.serialize() is data
+    assert db.to_json() is db.to_json()
+    assert json.loads(db.to_json()) == data
+    db.add_table(schema.Table('public.new'))
+    assert db.serialize() is not data
+    assert len(db.serialize()['tables']) == 5
+
+
+def test_table_serialize_cached():
+    table = schema.Table('public.foo')
+    data = table.serialize()
+    assert table.serialize() is data
+    table.add_column(schema.Column('id', 'integer'))
+    assert table.serialize()['columns'][0]['name'] == 'id'
+
+
+def test_serialize_tables():
+    db = create_tables_schema()
+
+    def names(**kwargs):
+        return [table['name'] for table in db.serialize_tables(**kwargs)]
+
+    assert names() == ['public.foo', 'public.bar', 'audit.log', 'public.baz']
+    assert names(pattern='public.%') == \
+        ['public.foo', 'public.bar', 'public.baz']
+    assert names(pattern='public.ba_') == ['public.bar', 'public.baz']
+    assert names(pattern='public.b') == []
+    assert names(limit=2) == ['public.foo', 'public.bar']
+    assert names(limit=2, offset=3) == ['public.baz']
+    assert names(pattern='public.%', offset=1) == ['public.bar', 'public.baz']
+
+
+def test_like_pattern():
+    assert schema.like_pattern('a.%')('a.b.c')
+    assert schema.like_pattern('a_c')('abc')
+    assert not schema.like_pattern('a_c')('abbc')
+    assert schema.like_pattern('a+(b)')('a+(b)')
@@ -0,0 +1,86 @@
+import pytest
+
+from mql.common import schema, snapshot
+from mql.common.errors import MqlSnapshotError
+
+
+def create_schema():
+    db = schema.SourceSchema('default')
+    table = schema.Table('public.foo', 'r')
+    table.add_column(schema.Column('id', 'integer', None, True, True))
+    column = schema.Column('state', 'enum', 'new')
+    column.add_enum('new')
+    column.add_enum('done')
+    table.add_column(column)
+    table.add_constraint(schema.Constraint('foo_pkey', 'primary_key', ['id']))
+    table.add_index(schema.Index('foo_pkey', ['id'], True, True, 'btree'))
+    table.add_index(schema.Index('foo_expr', [None, 'state']))
+    table.rows = 1000.0
+    table.pages = 10
+    table.columns[0].stats = schema.ColumnStats(0.0, -1.0, 4)
+    db.add_table(table)
+    table = schema.Table('public.bar', 'v', editable=False)
+    table.add_column(schema.Column('name', 'string', '', length=32))
+    table.add_constraint(schema.Constraint(
+        'bar_fkey', 'foreign_key', ['name'], 'public.foo', ['id']))
+    db.add_table(table)
+    return db
+
+
+def test_roundtrip():
+    db = create_schema()
+    assert snapshot.loads(snapshot.dumps(db)).serialize() == db.serialize()
+
+
+def test_size_and_stats():
+    table = snapshot.loads(snapshot.dumps(create_schema())).tables[0]
+    assert (table.rows, table.pages) == (1000.0, 10)
+    assert table.columns[0].stats == schema.ColumnStats(0.0, -1.0, 4)
+    assert table.columns[1].stats is None
+    assert [index.columns for index in table.indexes] == \
+        [['id'], [None, 'state']]
+
+
+def test_compact():
+    text = snapshot.dumps(create_schema())
+    assert ' ' not in text
+    assert '"version":{}'.format(snapshot.VERSION) in text
+
+
+def test_save_load(tmp_path):
+    path = tmp_path / 'schema.json'
+    db = create_schema()
+    snapshot.save(db, str(path))
+    assert snapshot.load(str(path)).serialize() == db.serialize()
+    assert [p.name for p in tmp_path.iterdir()] == ['schema.json']
+
+
+def test_save_error(tmp_path):
+    path = tmp_path / 'schema.json'
+    path.mkdir()
+    (path / 'file').write_text('')
+    with pytest.raises(MqlSnapshotError):
+        snapshot.save(create_schema(), str(path))
+    assert [p.name for p in tmp_path.iterdir()] == ['schema.json']
+    with pytest.raises(MqlSnapshotError):
+        snapshot.save(create_schema(), str(tmp_path / 'missing' / 'a.json'))
+
+
+def test_unsupported_version():
+    version = '"version":{}'.format(snapshot.VERSION)
+    text = snapshot.dumps(create_schema()).replace(version, '"version":1')
+    with pytest.raises(MqlSnapshotError):
+        snapshot.loads(text)
+
+
+@pytest.mark.parametrize('text', [
+    '', '[]', '{"version":2}', '{"version":2,"name":"a","tables":[[1]]}'
+])
+def test_invalid(text):
+    with pytest.raises(MqlSnapshotError):
+        snapshot.loads(text)
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(MqlSnapshotError):
+        snapshot.load(str(tmp_path / 'missing.json'))
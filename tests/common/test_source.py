@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from mql.common import errors, schema
+from mql.common.source import SchemaManager, Source, load_schemas
+
+
+class Executor:
+    def __init__(self):
+        self.loads = 0
+        self.changes = []
+        self.error = None
+
+    async def load_schema(self, name):
+        self.loads += 1
+        await asyncio.sleep(0)
+        if self.error:
+            raise self.error
+        return schema.SourceSchema(name)
+
+    def schema_changed(self, new_schema):
+        self.changes.append(new_schema)
+
+
+def create_source():
+    executor = Executor()
+    return Source('default', executor, schema.SourceSchema('db')), executor
+
+
+def test_schema_version():
+    first = schema.SourceSchema('db')
+    second = schema.SourceSchema('db')
+    assert second.version > first.version
+
+
+def test_set_schema():
+    source, executor = create_source()
+    calls = []
+    source.add_listener(lambda *args: calls.append(args))
+    old_schema = source.schema
+    new_schema = schema.SourceSchema('db')
+    source.set_schema(new_schema)
+    assert source.schema is new_schema
+    assert executor.changes == [new_schema]
+    assert calls == [(source, old_schema, new_schema)]
+
+
+def test_refresh():
+    source, executor = create_source()
+    manager = SchemaManager(source)
+    old_schema = source.schema
+
+    async def refresh():
+        first = manager.refresh()
+        second = manager.refresh()
+        assert first is second
+        return await first
+
+    new_schema = asyncio.run(refresh())
+    assert executor.loads == 1
+    assert source.schema is new_schema
+    assert new_schema.name == 'db'
+    assert new_schema.version > old_schema.version
+
+
+def test_refresh_error_keeps_schema():
+    source, executor = create_source()
+    executor.error = errors.MqlError('down')
+    manager = SchemaManager(source)
+    old_schema = source.schema
+
+    async def refresh():
+        return await manager.refresh()
+
+    assert asyncio.run(refresh()) is None
+    assert source.schema is old_schema
+    assert manager.last_error is executor.error
+    assert executor.changes == []
+
+
+def test_stale():
+    source, _ = create_source()
+    now = [0]
+    manager = SchemaManager(source, ttl=10, clock=lambda: now[0])
+    assert not manager.is_stale()
+    now[0] = 10
+    assert manager.is_stale()
+    assert not SchemaManager(source).is_stale()
+
+
+def test_start():
+    source, executor = create_source()
+    manager = SchemaManager(source, ttl=0.01)
+
+    async def run():
+        manager.start()
+        await asyncio.sleep(0.05)
+        manager.stop()
+
+    asyncio.run(run())
+    assert executor.loads >= 2
+
+
+def test_start_without_ttl():
+    source, _ = create_source()
+    with pytest.raises(errors.MqlError):
+        SchemaManager(source).start()
+
+
+def test_load_schemas():
+    sources = [create_source()[0] for _ in range(5)]
+    sources[1].executor.error = errors.MqlError('down')
+    old_schema = sources[1].schema
+    running = []
+    peak = []
+
+    async def loader(source):
+        running.append(source)
+        peak.append(len(running))
+        try:
+            return await source.executor.load_schema(source.schema.name)
+        finally:
+            running.remove(source)
+
+    results = asyncio.run(load_schemas(sources, concurrency=2, loader=loader))
+    assert max(peak) == 2
+    assert [result.source for result in results] == sources
+    assert [result.error is None for result in results] == \
+        [True, False, True, True, True]
+    assert sources[1].schema is old_schema
+    assert results[0].schema is sources[0].schema
+    assert all(result.seconds >= 0 for result in results)
+
+
+def test_load_schemas_timeout():
+    source, executor = create_source()
+
+    async def loader(source):
+        await asyncio.sleep(1)
+
+    result, = asyncio.run(load_schemas([source], loader=loader, timeout=0.01))
+    assert isinstance(result.error, asyncio.TimeoutError)
@@ -1,3 +1,5 @@
+import pytest
+
 from mql.common import ast, traverse
 
 from .base import VisitMixin, create_ast_tree
@@ -52,3 +54,223 @@ def test_walker():
     walker = Walker()
     traverse.walk(ast_tree, walker)
     assert walker.visited == VisitMixin.RESULTS
+
+
+def test_node_fields():
+    assert traverse.node_fields(ast.SelectTable) == ('name', 'source')
+    assert traverse.node_fields(ast.InExpression) == ('items', )
+    assert traverse.node_fields(ast.Placeholder) == ()
+
+
+def test_dispatch_per_class():
+    class A(traverse.NodeVisitor):
+        def visit_Identifier(self, node):
+            return 'a'
+
+    class B(A):
+        def visit_Identifier(self, node):
+            return 'b'
+
+    node = ast.Identifier('id')
+    assert A().visit(node) == 'a'
+    assert B().visit(node) == 'b'
+    assert A().visit(ast.Placeholder()) is None
+
+
+def test_walker_without_handler():
+    class Walker(traverse.NodeWalker):
+        def visit_Identifier(self, node, parent, path):
+            return node.name
+
+    walker = Walker()
+    assert walker.visit(ast.Identifier('id'), None, []) == 'id'
+    assert walker.visit(ast.Placeholder(), None, []) is None
+
+
+def test_walk_path():
+    paths = {}
+
+    class Walker(traverse.NodeWalker):
+        def visit_Identifier(self, node, parent, path):
+            paths.setdefault(node.name, (parent, list(path)))
+
+    tree = create_ast_tree()
+    traverse.walk(tree, Walker())
+    parent, path = paths['num']
+    assert isinstance(parent, ast.BinaryExpression)
+    assert parent.operator == '>'
+    assert path[0] is tree
+    assert isinstance(path[1], ast.SelectWhere)
+    assert path[-1] is parent
+    assert len(path) == 5
+
+
+def deep_tree(depth=5000):
+    node = ast.Identifier('leaf')
+    for _ in range(depth):
+        node = ast.UnaryExpression(node)
+    return node
+
+
+def test_walk_deep():
+    depth = 5000
+    node = deep_tree(depth)
+
+    class Walker(traverse.NodeWalker):
+        def visit_Identifier(self, node, parent, path):
+            self.depth = len(path)
+
+    walker = Walker()
+    traverse.walk(node, walker)
+    assert walker.depth == depth
+
+
+def test_visitor_deep():
+    class Visitor(traverse.NodeVisitor):
+        def visit_Identifier(self, node):
+            self.name = node.name
+
+    visitor = Visitor()
+    visitor.visit(deep_tree())
+    assert visitor.name == 'leaf'
+
+
+def test_iterative_visitor():
+    class Visitor(traverse.IterativeVisitor):
+        def __init__(self):
+            self.names = []
+
+        def visit_BinaryExpression(self, node):
+            self.names.append('(')
+            yield node.left
+            self.names.append(node.operator)
+            yield node.right
+            self.names.append(')')
+
+        def visit_Identifier(self, node):
+            self.names.append(node.name)
+
+    entered = []
+    left = []
+    visitor = Visitor()
+    tree = ast.SelectWhere(ast.BinaryExpression(
+        '=', ast.Identifier('a'), ast.Identifier('b')))
+    visitor.visit(tree, lambda node: entered.append(node) or node,
+                  left.append)
+    assert visitor.names == ['(', 'a', '=', 'b', ')']
+    assert entered[:2] == [tree, tree.condition]
+    assert left[-2:] == [tree.condition, tree]
+    assert len(entered) == len(left) == 4
+
+
+def test_iterative_visitor_deep():
+    class Visitor(traverse.IterativeVisitor):
+        def visit_Identifier(self, node):
+            self.name = node.name
+
+    visitor = Visitor()
+    visitor.visit(deep_tree())
+    assert visitor.name == 'leaf'
+
+
+def test_copy_node():
+    node = ast.SelectTable('a.b')
+    copy = traverse.copy_node(node, source='x')
+    assert (copy.name, copy.source) == ('a.b', 'x')
+    assert node.source == ''
+    with pytest.raises(AttributeError):
+        traverse.copy_node(node, missing=1)
+
+
+def test_copy_on_write_transformer():
+    class Transformer(traverse.CopyOnWriteTransformer):
+        def visit_Identifier(self, node):
+            if node.name == 'num':
+                return ast.Identifier('number')
+            return node
+
+        def visit_SelectOrderItem(self, node):
+            if node.direction == 'DESC':
+                return None
+            return node
+
+    ast_tree = create_ast_tree()
+    new_tree = Transformer().visit(ast_tree)
+    assert new_tree is not ast_tree
+    # input untouched
+    walker = type('Walker', (traverse.NodeWalker, VisitMixin), {})()
+    traverse.walk(ast_tree, walker)
+    assert walker.visited == VisitMixin.RESULTS
+    # unchanged subtrees are shared
+    assert new_tree.results is ast_tree.results
+    assert new_tree.table is ast_tree.table
+    assert new_tree.where.condition.left is ast_tree.where.condition.left
+    assert new_tree.where.condition.right.left.left.name == 'number'
+    assert [item.name for item in new_tree.order.items] == ['id']
+
+
+def test_copy_on_write_transformer_unchanged():
+    ast_tree = create_ast_tree()
+    assert traverse.CopyOnWriteTransformer().visit(ast_tree) is ast_tree
+
+
+def test_copy_on_write_transformer_deep():
+    class Transformer(traverse.CopyOnWriteTransformer):
+        def visit_Identifier(self, node):
+            return ast.Identifier('changed')
+
+    tree = deep_tree()
+    new_tree = Transformer().visit(tree)
+    assert traverse.CopyOnWriteTransformer().visit(tree) is tree
+    node = new_tree
+    while isinstance(node, ast.UnaryExpression):
+        node = node.argument
+    assert node.name == 'changed'
+
+
+def test_node_walkers_dispatch():
+    calls = []
+
+    class Identifiers(traverse.NodeWalker):
+        def visit_Identifier(self, node, parent, path):
+            calls.append(('identifier', node.name))
+
+    class Tables(traverse.NodeWalker):
+        def visit_SelectTable(self, node, parent, path):
+            calls.append(('table', node.name))
+            return 'stop'
+
+        def visit_Identifier(self, node, parent, path):
+            calls.append(('tables', node.name))
+
+    class Everything:
+        def visit(self, node, parent, path):
+            calls.append(('visit', node.__class__.__name__))
+
+    walkers = traverse.NodeWalkers([Identifiers(), Tables(), Everything()])
+    assert walkers.visit(ast.Placeholder(), None, []) is None
+    assert walkers.visit(ast.Identifier('id'), None, []) is None
+    assert walkers.visit(ast.SelectTable('foo'), None, []) == 'stop'
+    assert calls == [
+        ('visit', 'Placeholder'),
+        ('identifier', 'id'), ('tables', 'id'), ('visit', 'Identifier'),
+        ('table', 'foo'),
+    ]
+    handlers = walkers._handlers
+    assert [index for index, _ in handlers[ast.Identifier]] == [0, 1, 2]
+    assert [index for index, _ in handlers[ast.Placeholder]] == [2]
+    # shared by walkers of the same classes
+    other = traverse.NodeWalkers([Identifiers(), Tables(), Everything()])
+    assert other._handlers is handlers
+
+
+def test_walkers_dispatch_bounded():
+    class Walker(traverse.NodeWalker):
+        def visit_Identifier(self, node, parent, path):
+            pass
+
+    dispatch = traverse.NodeWalkers._dispatch
+    for _ in range(dispatch.maxsize + 10):
+        walker_class = type('Walker', (Walker, ), {})
+        traverse.NodeWalkers([walker_class()])
+    assert len(dispatch) <= dispatch.maxsize
@@ -0,0 +1,26 @@
+import pytest
+
+from mql.common.views import ListView
+
+
+def test_view():
+    items = [1, 2]
+    view = ListView(items)
+    assert len(view) == 2
+    assert view[0] == 1
+    assert view[-1] == 2
+    assert list(view) == [1, 2]
+    assert 2 in view
+    assert view == [1, 2]
+    assert view == (1, 2)
+    assert view != [1]
+    items.append(3)
+    assert len(view) == 3
+
+
+def test_view_read_only():
+    view = ListView([1])
+    with pytest.raises(TypeError):
+        view[0] = 2
+    with pytest.raises(AttributeError):
+        view.append(2)
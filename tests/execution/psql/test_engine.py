@@ -0,0 +1,222 @@
+import asyncio
+
+import pytest
+
+from mql.common import snapshot
+from mql.common.errors import MqlEngineError
+from mql.common.params import LiteralTransformer
+from mql.execution.psql import PgsqlEngine
+from mql.parser.parser import parse
+
+from .test_schema import ROWS, stats_rows
+
+
+class Connection:
+    def __init__(self, placeholder='number'):
+        self.placeholder = placeholder
+        self.queries = []
+        self.rows = [['[]']]
+
+    async def fetchall(self, sql, params=None):
+        self.queries.append((sql, params))
+        return self.rows
+
+
+def parametrize(query):
+    return LiteralTransformer().visit(parse(query))
+
+
+def test_build_sql():
+    engine = PgsqlEngine(Connection())
+    sql = engine.build_sql(parse('SELECT id FROM foo WHERE id = ?'))
+    assert sql.startswith('SELECT ')
+    assert 'WHERE (id=$1 )' in sql
+
+
+def test_build_sql_escape_string():
+    engine = PgsqlEngine(Connection())
+    sql = engine.build_sql(parse('DELETE FROM foo WHERE name = "a\'b"'))
+    assert "(name='a''b')" in sql
+
+
+def test_build_sql_escape_percent():
+    connection = Connection('percent')
+    engine = PgsqlEngine(connection)
+    query = 'SELECT id FROM foo WHERE name = "50%s" AND id = ?'
+    statement = engine.prepare(parse(query))
+    assert "(name='50%%s')" in statement.sql
+    assert statement.sql.replace('%%', '').count('%s') == 1
+    asyncio.run(engine.execute_sql(engine.build_sql(parse(
+        'DELETE FROM foo WHERE name = "%"'
+    ))))
+    assert connection.queries[-1][1] == []
+    connection.placeholder = 'number'
+    assert "(name='50%s')" in engine.build_sql(parse(query))
+
+
+def test_prepare():
+    connection = Connection()
+    engine = PgsqlEngine(connection)
+    statement = engine.prepare(parse('SELECT id FROM foo WHERE id = ?'))
+    result = asyncio.run(statement.execute([1]))
+    assert result.data == '[]'
+    assert result.encoded
+    assert connection.queries == [(statement.sql, [1])]
+
+
+def test_prepare_params_count():
+    engine = PgsqlEngine(Connection())
+    statement = engine.prepare(parse('SELECT id FROM foo WHERE id = ?'))
+    assert statement.params == 1
+    with pytest.raises(MqlEngineError):
+        asyncio.run(statement.execute([]))
+
+
+def test_sql_cache():
+    engine = PgsqlEngine(Connection())
+    sql1 = engine.build_sql(parametrize('SELECT id FROM foo WHERE id = 17'))
+    sql2 = engine.build_sql(parametrize('SELECT id FROM foo WHERE id = 18'))
+    assert sql1 is sql2
+    assert engine.sql_cache.info().hits == 1
+
+
+def test_sql_cache_literals():
+    engine = PgsqlEngine(Connection())
+    sql1 = engine.build_sql(parse('SELECT id FROM foo WHERE id = 17'))
+    sql2 = engine.build_sql(parse('SELECT id FROM foo WHERE id = 18'))
+    assert '17' in sql1
+    assert '18' in sql2
+
+
+def test_sql_cache_placeholder_style():
+    connection = Connection()
+    engine = PgsqlEngine(connection)
+    stmt = parse('SELECT id FROM foo WHERE id = ?')
+    assert '$1' in engine.build_sql(stmt)
+    connection.placeholder = 'percent'
+    assert '%s' in engine.build_sql(stmt)
+
+
+def test_sql_cache_load_schema():
+    connection = Connection()
+    engine = PgsqlEngine(connection)
+    engine.build_sql(parse('SELECT id FROM foo'))
+    assert len(engine.sql_cache) == 1
+    connection.rows = []
+    asyncio.run(engine.load_schema('foo'))
+    assert len(engine.sql_cache) == 0
+
+
+def schema_connection(rows=ROWS):
+    connection = Connection()
+    connection.rows = [[row] for row in rows]
+    return connection
+
+
+def test_load_schema_writes_snapshot(tmp_path):
+    path = str(tmp_path / 'schema.json')
+    connection = schema_connection()
+    engine = PgsqlEngine(connection)
+    schema = asyncio.run(engine.load_schema('default', path))
+    assert len(connection.queries) == 1
+    assert snapshot.load(path).serialize() == schema.serialize()
+    assert engine.refresh_task is None
+
+
+def test_load_schema_from_snapshot(tmp_path):
+    path = str(tmp_path / 'schema.json')
+    asyncio.run(PgsqlEngine(schema_connection()).load_schema('default', path))
+    changes = []
+
+    async def load():
+        engine = PgsqlEngine(schema_connection())
+        schema = await engine.load_schema('default', path, changes.append)
+        assert not engine.connection.queries
+        await engine.refresh_task
+        assert len(engine.connection.queries) == 1
+        return schema
+
+    schema = asyncio.run(load())
+    assert [table.name for table in schema.tables] == \
+        ['public.foo', 'public.bar']
+    assert changes == []
+
+
+def test_load_schema_stale_snapshot(tmp_path):
+    path = str(tmp_path / 'schema.json')
+    asyncio.run(PgsqlEngine(schema_connection()).load_schema('default', path))
+    changes = []
+    rows = [row for row in ROWS if row.get('name') != 'bar']
+
+    async def load():
+        engine = PgsqlEngine(schema_connection(rows))
+        schema = await engine.load_schema('default', path, changes.append)
+        await engine.refresh_task
+        return schema
+
+    schema = asyncio.run(load())
+    assert len(schema.tables) == 2
+    assert [len(live.tables) for live in changes] == [1]
+    assert len(snapshot.load(path).tables) == 1
+
+
+def test_load_schema_stale_snapshot_stats(tmp_path):
+    path = str(tmp_path / 'schema.json')
+    asyncio.run(PgsqlEngine(schema_connection()).load_schema('default', path))
+    changes = []
+
+    async def load():
+        engine = PgsqlEngine(schema_connection(stats_rows()))
+        await engine.load_schema('default', path, changes.append)
+        await engine.refresh_task
+
+    asyncio.run(load())
+    assert [live.get_table('public.foo').rows for live in changes] == [5000]
+    foo = snapshot.load(path).get_table('public.foo')
+    assert (foo.rows, foo.pages) == (5000, 40)
+    assert foo.get_column('name').stats is not None
+
+
+def test_load_schema_snapshot_not_writable(tmp_path):
+    path = str(tmp_path / 'missing' / 'schema.json')
+    engine = PgsqlEngine(schema_connection())
+    schema = asyncio.run(engine.load_schema('default', path))
+    assert len(schema.tables) == 2
+
+
+def test_load_schema_stale_snapshot_not_writable(tmp_path, monkeypatch):
+    path = str(tmp_path / 'schema.json')
+    asyncio.run(PgsqlEngine(schema_connection()).load_schema('default', path))
+    changes = []
+    rows = [row for row in ROWS if row.get('name') != 'bar']
+
+    def replace(src, dst):
+        raise OSError('read only')
+
+    async def load():
+        engine = PgsqlEngine(schema_connection(rows))
+        await engine.load_schema('default', path, changes.append)
+        monkeypatch.setattr(snapshot.os, 'replace', replace)
+        await engine.refresh_task
+
+    asyncio.run(load())
+    assert [len(live.tables) for live in changes] == [1]
+    assert [p.name for p in tmp_path.iterdir()] == ['schema.json']
+
+
+def test_load_schema_invalid_snapshot(tmp_path):
+    path = tmp_path / 'schema.json'
+    path.write_text('{')
+    connection = schema_connection()
+    engine = PgsqlEngine(connection)
+    schema = asyncio.run(engine.load_schema('default', str(path)))
+    assert len(connection.queries) == 1
+    assert len(schema.tables) == 2
+    assert len(snapshot.load(str(path)).tables) == 2
+
+
+def test_sql_cache_schema_changed():
+    engine = PgsqlEngine(Connection())
+    engine.build_sql(parse('SELECT id FROM foo'))
+    engine.schema_changed(None)
+    assert len(engine.sql_cache) == 0
@@ -0,0 +1,245 @@
+import asyncio
+
+import pytest
+
+from mql.execution.psql.schema import (Builder, StreamBuilder, load_lazy_schema,
+                                       load_schema)
+
+ROWS = [
+    {'type': 'namespace', 'id': 1, 'name': 'public'},
+    {'type': 'type', 'id': 23, 'kind': 'b', 'name': 'int4'},
+    {'type': 'type', 'id': 1043, 'kind': 'b', 'name': 'varchar'},
+    {'type': 'type', 'id': 700, 'kind': 'e', 'name': 'state'},
+    {'type': 'enum', 'id': 1, 'type_id': 700, 'name': 'state',
+     'namespace_id': 1, 'label': 'new'},
+    {'type': 'enum', 'id': 2, 'type_id': 700, 'name': 'state',
+     'namespace_id': 1, 'label': 'done'},
+    {'type': 'constraint', 'name': 'foo_pkey', 'kind': 'p', 'class_id': 100,
+     'fclass_id': None, 'conkey': [1], 'confkey': None},
+    {'type': 'constraint', 'name': 'bar_foo_fkey', 'kind': 'f',
+     'class_id': 200, 'fclass_id': 100, 'conkey': [2], 'confkey': [1]},
+    {'type': 'class', 'id': 100, 'name': 'foo', 'namespace_id': 1,
+     'type_id': 0, 'kind': 'r'},
+    {'type': 'class', 'id': 200, 'name': 'bar', 'namespace_id': 1,
+     'type_id': 0, 'kind': 'v'},
+    {'type': 'attribute', 'class_id': 100, 'num': 1, 'name': 'id',
+     'type_id': 23, 'notnull': True, 'hasdefault': True,
+     'stype': 'integer', 'svalue': "nextval('foo_id_seq'::regclass)"},
+    {'type': 'attribute', 'class_id': 100, 'num': 2, 'name': 'name',
+     'type_id': 1043, 'notnull': False, 'hasdefault': False,
+     'stype': 'character varying(32)', 'svalue': None},
+    {'type': 'attribute', 'class_id': 200, 'num': 1, 'name': 'state',
+     'type_id': 700, 'notnull': False, 'hasdefault': True,
+     'stype': 'state', 'svalue': "'new'::state"},
+    {'type': 'attribute', 'class_id': 200, 'num': 2, 'name': 'foo_id',
+     'type_id': 23, 'notnull': False, 'hasdefault': False,
+     'stype': 'integer', 'svalue': None},
+]
+
+
+class Connection:
+    def __init__(self, rows):
+        self.rows = [[row] for row in rows]
+
+    async def fetchall(self, sql, params=None):
+        return self.rows
+
+
+def build(rows=ROWS):
+    builder = Builder()
+    for row in rows:
+        builder.add(row)
+    return builder
+
+
+def test_builder_tables():
+    db = build().get_schema('default')
+    assert db.name == 'default'
+    assert [table.name for table in db.tables] == ['public.foo', 'public.bar']
+    assert [table.kind for table in db.tables] == ['r', 'v']
+
+
+def test_builder_columns():
+    foo, bar = build().get_schema('default').tables
+    id_, name = foo.columns
+    assert (id_.name, id_.type, id_.is_primary, id_.not_null) == \
+        ('id', 'integer', True, True)
+    assert (name.name, name.type, name.length, name.is_primary) == \
+        ('name', 'string', 32, False)
+    state, foo_id = bar.columns
+    assert (state.type, state.default_value, state.enum) == \
+        ('enum', 'new', ['new', 'done'])
+    assert not foo_id.is_primary
+
+
+def test_builder_indexes():
+    builder = build()
+    assert builder.find_type({'type_id': 23}).name == 'int4'
+    assert builder.find_type({'type_id': 1}) is None
+    assert builder.find_namespace({'namespace_id': 1}).name == 'public'
+    assert builder.find_class({'class_id': 200}).name == 'bar'
+    assert builder.find_enum({'type_id': 700}).labels == ['new', 'done']
+    assert [attr.name for attr in builder.get_attrs(100)] == ['id', 'name']
+    assert list(builder.get_attrs(300)) == []
+
+
+def test_load_schema():
+    db = asyncio.run(load_schema(Connection(ROWS), 'default'))
+    assert len(db.tables) == 2
+
+
+def test_builder_constraints():
+    foo, bar = build().get_schema('default').tables
+    assert [c.serialize() for c in foo.constraints] == [{
+        'name': 'foo_pkey', 'kind': 'primary_key', 'columns': ['id'],
+        'foreign_table': None, 'foreign_columns': None
+    }]
+    assert [c.serialize() for c in bar.constraints] == [{
+        'name': 'bar_foo_fkey', 'kind': 'foreign_key', 'columns': ['foo_id'],
+        'foreign_table': 'public.foo', 'foreign_columns': ['id']
+    }]
+
+
+class CatalogConnection:
+    def __init__(self, placeholder='number'):
+        self.placeholder = placeholder
+        self.queries = []
+
+    async def fetchall(self, sql, params=None):
+        self.queries.append((sql, params))
+        if params is None:
+            return [
+                [{'id': 100, 'namespace': 'public', 'name': 'foo'}],
+                [{'id': 200, 'namespace': 'public', 'name': 'bar'}],
+            ]
+        class_ids = params[0]
+        return [
+            [row] for row in ROWS
+            if row['type'] != 'class' or row['id'] in class_ids
+        ]
+
+
+@pytest.mark.parametrize('placeholder, expected', [
+    ('number', 'oid = ANY($1)'), ('percent', 'oid = ANY(%s)')
+])
+def test_load_lazy_schema(placeholder, expected):
+    connection = CatalogConnection(placeholder)
+    db = asyncio.run(load_lazy_schema(connection, 'default'))
+    assert db.table_names == ['public.foo', 'public.bar']
+    assert db.tables == []
+    asyncio.run(db.load_tables(['public.bar']))
+    sql, params = connection.queries[-1]
+    assert expected in sql
+    assert params == [[200]]
+    assert [table.name for table in db.tables] == ['public.bar']
+    assert [c.name for c in db.get_table('public.bar').columns] == \
+        ['state', 'foo_id']
+
+
+class ChunksConnection:
+    def __init__(self, rows):
+        self.rows = [[row] for row in rows]
+        self.chunks = []
+
+    async def fetch_chunks(self, sql, params=None, size=1000):
+        for start in range(0, len(self.rows), size):
+            chunk = self.rows[start:start + size]
+            self.chunks.append(len(chunk))
+            yield chunk
+
+
+def stream_build(rows=ROWS):
+    builder = StreamBuilder()
+    for row in rows:
+        builder.add(row)
+    return builder
+
+
+def test_stream_builder_same_schema():
+    rows = ROWS + [
+        {'type': 'constraint', 'name': 'foo_bar_fkey', 'kind': 'f',
+         'class_id': 100, 'fclass_id': 200, 'conkey': [2], 'confkey': [2]},
+    ]
+    # constraints come before classes and attributes
+    rows.sort(key=lambda row: row['type'] in ('class', 'attribute'))
+    expected = build(rows).get_schema('default').serialize()
+    assert stream_build(rows).get_schema('default').serialize() == expected
+    foo = expected['tables'][0]
+    assert foo['constraints'][1]['foreign_columns'] == ['foo_id']
+
+
+@pytest.mark.parametrize('build_rows', [build, stream_build])
+def test_builder_foreign_class_not_loaded(build_rows):
+    rows = [
+        dict(row, ftable='public.foo', fcolumns=['id'])
+        if row.get('name') == 'bar_foo_fkey' else row
+        for row in ROWS
+        if row.get('class_id', row.get('id')) != 100 or
+        row['type'] not in ('class', 'attribute', 'constraint')
+    ]
+    bar, = build_rows(rows).get_schema('default').tables
+    constraint, = bar.constraints
+    assert (constraint.foreign_table, constraint.foreign_columns) == \
+        ('public.foo', ['id'])
+
+
+def test_stream_builder_releases_nodes():
+    builder = stream_build()
+    assert list(builder.attrs) == [200]
+    assert 100 in builder.tables
+    assert 100 not in builder.constraints
+    tables = list(builder.get_tables())
+    assert [table.name for table in tables] == ['public.foo', 'public.bar']
+    assert not builder.attrs
+    assert not builder.tables
+
+
+def test_load_schema_chunks():
+    connection = ChunksConnection(ROWS)
+    db = asyncio.run(load_schema(connection, 'default', chunk_size=5))
+    assert connection.chunks == [5, 5, 4]
+    assert db.serialize() == build().get_schema('default').serialize()
+
+
+STATS_ROWS = [
+    {'type': 'index', 'name': 'foo_pkey', 'class_id': 100, 'keys': [1],
+     'unique': True, 'primary': True, 'method': 'btree'},
+    {'type': 'index', 'name': 'foo_name_expr', 'class_id': 100,
+     'keys': [2, 0], 'unique': False, 'primary': False, 'method': 'btree'},
+    {'type': 'stat', 'class_id': 100, 'name': 'name', 'null_frac': 0.5,
+     'n_distinct': -0.25, 'avg_width': 12},
+]
+
+
+def stats_rows():
+    rows = []
+    for row in ROWS:
+        if row['type'] == 'class':
+            row = dict(row, rows=5000.0, pages=40)
+            if row['id'] == 100:
+                rows.extend(STATS_ROWS)
+        rows.append(row)
+    return rows
+
+
+@pytest.mark.parametrize('builder_class', [Builder, StreamBuilder])
+def test_builder_indexes_and_stats(builder_class):
+    builder = builder_class()
+    for row in stats_rows():
+        builder.add(row)
+    foo, bar = builder.get_schema('default').tables
+    assert (foo.rows, foo.pages) == (5000.0, 40)
+    assert [(index.name, index.columns, index.unique, index.primary)
+            for index in foo.indexes] == [
+        ('foo_pkey', ['id'], True, True),
+        ('foo_name_expr', ['name', None], False, False),
+    ]
+    assert foo.is_indexed('id')
+    assert foo.is_indexed('name')
+    assert not bar.is_indexed('foo_id')
+    assert foo.get_column('id').stats is None
+    stats = foo.get_column('name').stats
+    assert (stats.null_frac, stats.n_distinct, stats.avg_width) == \
+        (0.5, -0.25, 12)
+    assert 'rows' not in foo.serialize()
+    assert foo.serialize()['indexes'][0]['method'] == 'btree'
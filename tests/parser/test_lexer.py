@@ -451,3 +451,11 @@ def match_tokens(query, matches):
         assert token.value == match[1]
         assert token.start == match[2]
         assert token.end == match[3]
+
+
+def test_keyword_mixed_case():
+    tokens = all_tokens('SeLeCt selected')
+    assert tokens[0].type == Tokens.KEYWORD
+    assert tokens[0].value == 'SeLeCt'
+    assert tokens[1].type == Tokens.IDENTIFIER
+    assert tokens[1].value == 'selected'
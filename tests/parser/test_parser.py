@@ -2,7 +2,7 @@ import pytest
 
 from mql.common import ast
 from mql.common.errors import MqlSyntaxError
-from mql.parser.parser import expression, parse
+from mql.parser.parser import Limits, expression, parse
 
 
 def test_empty_expression():
@@ -689,3 +689,93 @@ def test_show_tables():
     assert isinstance(stmt, ast.ShowSourceStatement)
     assert isinstance(stmt.source, ast.Source)
     assert stmt.source.name == 'foo.bar'
+
+
+def test_show_source_filter():
+    stmt = parse('SHOW SOURCE foo LIKE "public.%" LIMIT 10 OFFSET 20')
+    assert stmt.source.name == 'foo'
+    assert stmt.pattern == 'public.%'
+    assert stmt.limit == 10
+    assert stmt.offset == 20
+
+    stmt = parse('SHOW SOURCE foo OFFSET 5')
+    assert (stmt.pattern, stmt.limit, stmt.offset) == (None, None, 5)
+
+    with pytest.raises(MqlSyntaxError):
+        parse('SHOW SOURCE foo LIKE bar')
+    with pytest.raises(MqlSyntaxError):
+        parse('SHOW SOURCE foo LIMIT 1 LIKE "a"')
+
+
+def test_expression_deep_nesting():
+    depth = 5000
+    expr = expression('(a = ? AND ' * depth + 'b = ?' + ')' * depth)
+    for _ in range(depth):
+        assert isinstance(expr, ast.LogicalExpression)
+        assert expr.operator == 'AND'
+        assert expr.left.operator == '='
+        expr = expr.right
+    assert expr.left.name == 'b'
+
+
+def test_expression_not_group():
+    expr = expression('a = NOT (b = c)')
+    assert isinstance(expr.right, ast.UnaryExpression)
+    assert isinstance(expr.right.argument, ast.BinaryExpression)
+
+
+def test_limit_length():
+    query = 'SELECT * FROM foo WHERE id = 1'
+    parse(query, Limits(length=len(query)))
+    with pytest.raises(MqlSyntaxError) as info:
+        parse(query + ' ', Limits(length=len(query)))
+    assert str(info.value) == 'Query is too long, limit is {}'.format(
+        len(query))
+
+
+@pytest.mark.parametrize('query, depth', [
+    ('SELECT * FROM foo WHERE a = 1 AND b = 2 AND c = 3', 4),
+    ('SELECT * FROM foo WHERE ((((a = 1))))', 4),
+    ('SELECT * FROM foo WHERE a = NOT (b = 1)', 4),
+])
+def test_limit_depth(query, depth):
+    parse(query, Limits(depth=depth))
+    with pytest.raises(MqlSyntaxError) as info:
+        parse(query, Limits(depth=depth - 1))
+    assert str(info.value) == 'Expression is too deep, limit is {}'.format(
+        depth - 1)
+
+
+def test_limit_depth_stops_early():
+    query = 'SELECT * FROM foo WHERE ' + '(' * 10 ** 5 + 'a'
+    with pytest.raises(MqlSyntaxError) as info:
+        parse(query, limits=Limits(depth=100))
+    assert info.value.position < 200
+
+
+@pytest.mark.parametrize('query, count', [
+    ('SELECT a, b AS c FROM t WHERE a = 1 AND NOT (b > 2) '
+     'ORDER BY a LIMIT 1 OFFSET 2', 17),
+    ('INSERT INTO t (a, b) VALUES (1, ?)', 6),
+    ('UPDATE t SET a = 1, b = ? WHERE id = 1', 9),
+    ('DELETE FROM t WHERE id = 1', 5),
+])
+def test_limit_nodes(query, count):
+    parse(query, limits=Limits(nodes=count))
+    with pytest.raises(MqlSyntaxError) as info:
+        parse(query, limits=Limits(nodes=count - 1))
+    assert str(info.value) == 'Query has too many nodes, limit is {}'.format(
+        count - 1)
+
+
+def test_limit_results():
+    parse('SELECT a, b FROM foo', limits=Limits(results=2))
+    with pytest.raises(MqlSyntaxError) as info:
+        parse('SELECT a, b, c FROM foo', limits=Limits(results=2))
+    assert str(info.value) == 'Too many result columns, limit is 2'
+
+
+def test_like_not_reserved():
+    stmt = parse('SELECT like FROM foo WHERE like = 1')
+    assert stmt.results[0].name == 'like'
+    assert parse('SHOW SOURCE foo like "a%"').pattern == 'a%'
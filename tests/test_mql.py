@@ -0,0 +1,309 @@
+import asyncio
+import json
+
+import pytest
+
+from mql.common import ast, errors, execution, schema
+from mql.common.source import Source
+from mql.mql import Mql, SourceTransformer
+from mql.parser.parser import Limits, parse
+from mql.validation import validation_key
+from mql.validation.rules import CostGuardRule, SelectUniqueResultsRule
+
+
+class Executor:
+    def __init__(self):
+        self.documents = []
+
+    async def execute(self, context):
+        self.documents.append(context.ast_document)
+        return execution.ExecuteResult(context.params)
+
+
+def create_mql(**kwargs):
+    executor = Executor()
+    source = Source('default', executor, schema.SourceSchema('default'))
+    return Mql([source], **kwargs), source, executor
+
+
+def execute(mql, query, params=None):
+    return asyncio.run(mql.execute(query, params))
+
+
+def test_execute():
+    mql, _, executor = create_mql()
+    result = execute(mql, 'SELECT * FROM foo WHERE id = ?', [1])
+    assert not result.has_errors()
+    assert result.data == [1]
+    stmt = executor.documents[0]
+    assert isinstance(stmt, ast.SelectStatement)
+    assert stmt.table.source == 'default'
+
+
+def test_cache_hit():
+    mql, _, executor = create_mql()
+    execute(mql, 'SELECT * FROM foo WHERE id = ?', [1])
+    execute(mql, 'SELECT * FROM foo WHERE id = ?', [2])
+    info = mql.cache.info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert executor.documents[0] is executor.documents[1]
+
+
+def test_cache_params_types():
+    mql, _, executor = create_mql()
+    execute(mql, 'SELECT * FROM foo WHERE id = ?', [1])
+    execute(mql, 'SELECT * FROM foo WHERE id = ?', ['1'])
+    assert mql.cache.info().misses == 2
+
+
+def test_cache_skip_errors():
+    mql, _, _ = create_mql()
+    result = execute(mql, 'SELECT a, a FROM foo')
+    assert result.has_errors()
+    assert len(mql.cache) == 0
+
+
+def test_cache_schema_replaced():
+    mql, source, executor = create_mql()
+    execute(mql, 'SELECT * FROM foo')
+    source._schema = schema.SourceSchema('default')
+    execute(mql, 'SELECT * FROM foo')
+    assert executor.documents[0] is not executor.documents[1]
+
+
+def test_cache_disabled():
+    mql, _, executor = create_mql(cache_size=0)
+    execute(mql, 'SELECT * FROM foo')
+    execute(mql, 'SELECT * FROM foo')
+    assert len(mql.cache) == 0
+    assert executor.documents[0] is not executor.documents[1]
+
+
+def test_parametrize():
+    mql, _, executor = create_mql(parametrize=True)
+    result = execute(mql, 'UPDATE foo SET a=? WHERE id=17', ['a'])
+    assert result.data == ['a', 17]
+    assert isinstance(executor.documents[0].where.right, ast.Parameter)
+
+
+class Statement:
+    def __init__(self, ast_document):
+        self.ast_document = ast_document
+
+    async def execute(self, params):
+        return execution.ExecuteResult((self.ast_document, params))
+
+
+class PreparingExecutor(Executor):
+    def prepare(self, ast_document):
+        return Statement(ast_document)
+
+
+def test_prepare():
+    executor = PreparingExecutor()
+    source = Source('default', executor, schema.SourceSchema('default'))
+    mql = Mql([source])
+    prepared = mql.prepare('SELECT * FROM foo WHERE id = ?')
+    result = asyncio.run(prepared.execute([1]))
+    ast_document, params = result.data
+    assert ast_document is prepared.ast_document
+    assert params == [1]
+    assert executor.documents == []
+
+
+def test_prepare_without_statement():
+    mql, _, executor = create_mql()
+    prepared = mql.prepare('SELECT * FROM foo WHERE id = ?')
+    assert prepared.statement is None
+    result = asyncio.run(prepared.execute([1]))
+    assert result.data == [1]
+    assert executor.documents == [prepared.ast_document]
+
+
+def test_prepare_invalid():
+    mql, _, _ = create_mql()
+    with pytest.raises(errors.MqlValidationError):
+        mql.prepare('SELECT a, a FROM foo')
+
+
+def test_source_transformer_copy_on_write():
+    document = parse('SELECT * FROM a.b.c')
+    transformed = SourceTransformer('default').visit(document)
+    assert (transformed.table.source, transformed.table.name) == ('a', 'b.c')
+    assert (document.table.source, document.table.name) == ('', 'a.b.c')
+    assert transformed.results is document.results
+
+
+def test_cache_pruned_on_schema_change():
+    mql, source, _ = create_mql()
+    execute(mql, 'SELECT * FROM foo')
+    assert len(mql.cache) == 1
+    source.set_schema(schema.SourceSchema('default'))
+    assert len(mql.cache) == 0
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_validation_cache(pipeline):
+    mql, source, _ = create_mql(pipeline=pipeline, validation_cache_size=8)
+    for _ in range(2):
+        assert execute(mql, 'SELECT a, a FROM foo').has_errors()
+        assert not execute(mql, 'SELECT a FROM foo').has_errors()
+    info = mql.validation_cache.info()
+    # without pipeline valid query is then found in the query cache
+    assert (info.hits, info.misses, info.size) == (1 + pipeline, 2, 2)
+    source.set_schema(schema.SourceSchema('default'))
+    assert len(mql.validation_cache) == 0
+
+
+def test_validation_cache_disabled():
+    mql, _, _ = create_mql()
+    execute(mql, 'SELECT a, a FROM foo')
+    execute(mql, 'SELECT a, a FROM foo')
+    assert mql.validation_cache.info().hits == 0
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_rules(pipeline):
+    table = schema.Table('foo', rows=10 ** 6)
+    source_schema = schema.SourceSchema('default')
+    source_schema.add_table(table)
+    source = Source('default', Executor(), source_schema)
+    mql = Mql(
+        [source], pipeline=pipeline,
+        rules=[SelectUniqueResultsRule, CostGuardRule]
+    )
+    result = execute(mql, 'SELECT * FROM foo LIMIT 10')
+    assert not result.has_errors()
+    result = execute(mql, 'SELECT * FROM foo')
+    assert result.has_errors()
+    assert not execute(mql, 'SELECT * FROM bar').has_errors()
+
+
+def test_limits():
+    mql, _, _ = create_mql(limits=Limits(results=1))
+    result = execute(mql, 'SELECT a, b FROM foo')
+    assert isinstance(result.errors[0], errors.MqlSyntaxError)
+    assert not execute(mql, 'SELECT a FROM foo').has_errors()
+
+
+def create_lazy_mql(**kwargs):
+    loaded = []
+
+    async def loader(names):
+        loaded.extend(names)
+        return [schema.Table(name) for name in names]
+
+    lazy_schema = schema.LazySourceSchema('default', ['public.foo'], loader)
+    source = Source('default', Executor(), lazy_schema)
+    return Mql([source], **kwargs), lazy_schema, loaded
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_lazy_schema(pipeline):
+    mql, lazy_schema, loaded = create_lazy_mql(pipeline=pipeline)
+    result = execute(mql, 'SELECT * FROM public.foo')
+    assert not result.has_errors()
+    assert loaded == ['public.foo']
+    assert lazy_schema.get_table('public.foo') is not None
+    execute(mql, 'SELECT id FROM public.foo')
+    assert loaded == ['public.foo']
+
+
+def test_lazy_schema_prepare_not_cached():
+    async def loader(names):
+        return [schema.Table(name, rows=10 ** 7) for name in names]
+
+    lazy_schema = schema.LazySourceSchema('default', ['public.big'], loader)
+    source = Source('default', PreparingExecutor(), lazy_schema)
+    mql = Mql(
+        [source], rules=[SelectUniqueResultsRule, CostGuardRule],
+        validation_cache_size=0
+    )
+    query = 'SELECT x FROM public.big'
+    mql.prepare(query)
+    assert len(mql.cache) == 0
+    assert execute(mql, query).has_errors()
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_lazy_schema_unqualified_table(pipeline):
+    async def loader(names):
+        return [schema.Table(name, rows=10 ** 7) for name in names]
+
+    lazy_schema = schema.LazySourceSchema('default', ['public.big'], loader)
+    source = Source('default', PreparingExecutor(), lazy_schema)
+    mql = Mql([source], rules=[CostGuardRule], pipeline=pipeline)
+    result = execute(mql, 'SELECT x FROM big')
+    assert result.has_errors()
+    assert lazy_schema.get_table('public.big') is not None
+    assert len(mql.cache) == 0
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+def test_lazy_schema_validation_cache(pipeline):
+    async def loader(names):
+        return [schema.Table(name, rows=10 ** 7) for name in names]
+
+    lazy_schema = schema.LazySourceSchema('default', ['public.big'], loader)
+    source = Source('default', PreparingExecutor(), lazy_schema)
+    mql = Mql(
+        [source], rules=[SelectUniqueResultsRule, CostGuardRule],
+        pipeline=pipeline, validation_cache_size=8
+    )
+    query = 'SELECT x FROM public.big'
+    mql.prepare(query)
+    assert execute(mql, query).has_errors()
+    assert execute(mql, query).has_errors()
+
+
+def test_validation_key_lazy_loads():
+    lazy_schema = create_lazy_mql()[1]
+    document = parse('SELECT * FROM public.foo')
+    key = validation_key(lazy_schema, document, None, ())
+    asyncio.run(lazy_schema.load_tables(['public.foo']))
+    assert validation_key(lazy_schema, document, None, ()) != key
+
+
+def create_show_mql(**kwargs):
+    db = schema.SourceSchema('default')
+    for name in ('public.foo', 'public.bar', 'audit.log'):
+        db.add_table(schema.Table(name))
+    return Mql([Source('default', Executor(), db)], **kwargs), db
+
+
+def test_show_source():
+    mql, db = create_show_mql()
+    result = execute(mql, 'SHOW SOURCE default')
+    assert result.data is db.serialize()
+    assert not result.encoded
+
+
+def test_show_source_encoded():
+    mql, db = create_show_mql(encode_schema=True)
+    result = execute(mql, 'SHOW SOURCE default')
+    assert result.encoded
+    assert result.data is db.to_json()
+
+
+@pytest.mark.parametrize('encode_schema', [False, True])
+def test_show_source_page(encode_schema):
+    mql, _ = create_show_mql(encode_schema=encode_schema)
+    result = execute(mql, 'SHOW SOURCE default LIKE "public.%" LIMIT 1 '
+                          'OFFSET 1')
+    data = json.loads(result.data) if encode_schema else result.data
+    assert result.encoded == encode_schema
+    assert data['name'] == 'default'
+    assert [table['name'] for table in data['tables']] == ['public.bar']
+
+
+def test_load_schemas():
+    class LoadingExecutor(Executor):
+        async def load_schema(self, name):
+            return schema.SourceSchema(name)
+
+    source = Source('db', LoadingExecutor(), schema.SourceSchema('db'))
+    mql = Mql([source, create_mql()[1]])
+    results = asyncio.run(mql.load_schemas())
+    assert [result.source for result in results] == [source]
+    assert source.schema is results[0].schema
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from mql.common import ast, errors, schema
+from mql.common.source import Source
+from mql.execution.psql import PgsqlEngine
+from mql.mql import Mql
+from mql.parser.parser import parse
+from tests.execution.psql.test_engine import Connection
+
+QUERIES = [
+    'SELECT * FROM foo',
+    'SELECT id, name AS n FROM foo WHERE id = ? AND name = "a\'b"',
+    'SELECT id FROM foo WHERE id = ? ORDER BY id DESC LIMIT 10 OFFSET 5',
+    'SELECT id FROM foo WHERE (a = 1 OR b = 2) AND c = 3',
+    'INSERT INTO foo (id, name) VALUES (1, ?)',
+    'UPDATE foo SET name = ? WHERE id = 7',
+    'DELETE FROM foo WHERE id = 8',
+]
+
+
+def create_mql(**kwargs):
+    connection = Connection()
+    engine = PgsqlEngine(connection)
+    source = Source('default', engine, schema.SourceSchema('default'))
+    return Mql([source], pipeline=True, **kwargs), engine, connection
+
+
+def execute(mql, query, params=None):
+    return asyncio.run(mql.execute(query, params))
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_same_sql(query):
+    mql, engine, _ = create_mql()
+    expected = parse(query)
+    for transformer in mql._transformers:
+        expected = transformer.visit(expected)
+    prepared = mql.prepare(query)
+    assert prepared.statement.sql == engine.build_sql(expected)
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_same_sql_parametrize(query):
+    mql, engine, _ = create_mql(parametrize=True)
+    expected = Mql([engine_source(engine)], parametrize=True).prepare(query)
+    prepared = mql.prepare(query)
+    assert prepared.statement.sql == expected.statement.sql
+    assert prepared.statement.params == expected.statement.params
+
+
+def engine_source(engine):
+    return Source('default', engine, schema.SourceSchema('default'))
+
+
+def test_execute():
+    mql, _, connection = create_mql(parametrize=True)
+    result = execute(mql, 'SELECT id FROM foo WHERE id = 17 AND name = ?',
+                      ['a'])
+    assert not result.has_errors()
+    sql, params = connection.queries[0]
+    assert 'id=$1' in sql
+    assert params == [17, 'a']
+
+
+def test_validation_errors():
+    mql, _, connection = create_mql()
+    result = execute(mql, 'SELECT a, a FROM foo')
+    assert result.has_errors()
+    assert not connection.queries
+    with pytest.raises(errors.MqlValidationError):
+        mql.prepare('SELECT a, a FROM foo')
+
+
+def test_show_sources():
+    mql, _, _ = create_mql()
+    result = execute(mql, 'SHOW SOURCES')
+    assert result.data == ['default']
+
+
+class RenameTransformer:
+    def visit_Identifier(self, node):
+        if node.name == 'secret':
+            return ast.Identifier('public')
+        return node
+
+
+class BrokenTransformer:
+    def visit_Identifier(self, node):
+        return None
+
+
+def test_transformer_node_local():
+    mql, _, _ = create_mql(transformers=[RenameTransformer()])
+    prepared = mql.prepare('SELECT id FROM foo WHERE secret = 1')
+    assert '(public=1)' in prepared.statement.sql
+
+
+def test_transformer_must_return_node():
+    mql, _, _ = create_mql(transformers=[BrokenTransformer()])
+    with pytest.raises(errors.MqlError):
+        mql.prepare('SELECT id FROM foo WHERE id = 1')
+
+
+@pytest.mark.parametrize('pipeline', [False, True])
+@pytest.mark.parametrize('parametrize', [False, True])
+def test_execute_deep_filter(pipeline, parametrize):
+    connection = Connection()
+    source = Source(
+        'default', PgsqlEngine(connection), schema.SourceSchema('default')
+    )
+    mql = Mql([source], pipeline=pipeline, parametrize=parametrize)
+    condition = 'z = 1'
+    for i in range(3000):
+        condition = '(a = {} {} {})'.format(i, 'OR' if i % 2 else 'AND',
+                                            condition)
+    query = 'SELECT a FROM foo WHERE ' + condition
+    mql.prepare(query)
+    result = execute(mql, query)
+    assert not result.has_errors()
+    sql, params = connection.queries[-1]
+    assert sql.count('(a=') == 3000
+    assert len(params or ()) == (3001 if parametrize else 0)
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+
+import pytest
+
+from mql.common import schema
+from mql.common.traverse import walk
+from mql.parser.parser import parse
+from mql.validation import ValidatorContext, validate
+from mql.validation.rules import CostGuardRule
+
+
+def create_schema(rows=1000000, name='foo'):
+    table = schema.Table(name, rows=rows)
+    table.add_column(schema.Column('id', schema.Type('int4')))
+    table.add_column(schema.Column('state', schema.Type('text')))
+    table.add_index(schema.Index('foo_pkey', ['id'], True, True))
+    source_schema = schema.SourceSchema('default')
+    source_schema.add_table(table)
+    return source_schema
+
+
+def check(query, rows=1000000, **kwargs):
+    rule = CostGuardRule.configure(**kwargs) if kwargs else CostGuardRule
+    return validate(create_schema(rows), parse(query), None, [rule])
+
+
+@pytest.mark.parametrize('query', [
+    'SELECT * FROM foo WHERE id = ? LIMIT 10',
+    'SELECT * FROM foo WHERE state = ? AND id > 5 LIMIT 10',
+    'SELECT * FROM foo WHERE id = 1 OR id = 2 LIMIT 10',
+    'SELECT * FROM foo LIMIT 10',
+    'SELECT * FROM bar',
+    'UPDATE foo SET state = ? WHERE id = ?',
+    'DELETE FROM foo WHERE id = ?',
+])
+def test_allowed(query):
+    assert check(query) == []
+
+
+@pytest.mark.parametrize('query', [
+    'SELECT * FROM foo WHERE state = ? LIMIT 10',
+    'SELECT * FROM foo WHERE state = ? ORDER BY id LIMIT 10',
+    'SELECT * FROM foo WHERE id = 1 OR state = ? ORDER BY id LIMIT 10',
+    'SELECT * FROM foo WHERE id != 1 ORDER BY id LIMIT 10',
+    'UPDATE foo SET state = ? WHERE state = ?',
+    'DELETE FROM foo WHERE state = ?',
+])
+def test_full_scan(query):
+    errors = check(query)
+    assert len(errors) == 1
+    assert errors[0].startswith('Full scan of table foo')
+
+
+def test_missing_limit():
+    errors = check('SELECT * FROM foo WHERE id > ?')
+    assert errors == ['Missing LIMIT for table foo with about 1000000 rows']
+    assert check('SELECT * FROM foo WHERE id > ?', require_limit=False) \
+        == []
+    assert len(check('SELECT * FROM foo WHERE state = ?')) == 2
+
+
+@pytest.mark.parametrize('query', [
+    'SELECT * FROM foo WHERE id = ?',
+    'SELECT * FROM foo WHERE id = ? AND state = ?',
+])
+def test_unique_search_without_limit(query):
+    assert check(query) == []
+
+
+@pytest.mark.parametrize('query', [
+    'SELECT * FROM foo WHERE id = ? OR id = ?',
+    'SELECT * FROM foo WHERE id = state',
+    'SELECT * FROM foo WHERE id != ?',
+])
+def test_not_unique_search_without_limit(query):
+    assert 'Missing LIMIT for table foo with about 1000000 rows' in \
+        check(query)
+
+
+def test_unique_search_multicolumn():
+    source_schema = create_schema()
+    table = source_schema.get_table('foo')
+    table.add_index(schema.Index('foo_state_key', ['state', 'kind'], True))
+    table.add_index(schema.Index('foo_lower_key', ['state', None], True))
+
+    def errors(query):
+        return validate(source_schema, parse(query), None, [CostGuardRule])
+
+    assert errors('SELECT * FROM foo WHERE state = ? AND kind = ?') == []
+    assert errors('SELECT * FROM foo WHERE state = ?') == [
+        'Missing LIMIT for table foo with about 1000000 rows'
+    ]
+
+
+@pytest.mark.parametrize('rows', [None, -1, 100])
+def test_small_or_unknown_table(rows):
+    assert check('SELECT * FROM foo', rows) == []
+
+
+def test_max_rows():
+    assert check('SELECT * FROM foo', max_rows=2000000) == []
+    assert check('SELECT * FROM foo', rows=10, max_rows=5)
+
+
+def test_configure_cached():
+    rule = CostGuardRule.configure(max_rows=10, action='warn')
+    assert CostGuardRule.configure(max_rows=10, action='warn') is rule
+    assert CostGuardRule.configure(max_rows=20, action='warn') is not rule
+
+
+def test_configure_keeps_defaults():
+    rule = CostGuardRule.configure(action='warn')
+    assert rule.max_rows == CostGuardRule.max_rows
+    assert rule.require_limit
+    assert CostGuardRule.action == 'error'
+    with pytest.raises(ValueError):
+        CostGuardRule.configure(action='ignore')
+
+
+def test_warn(caplog):
+    document = parse('SELECT * FROM foo')
+    context = ValidatorContext(create_schema(), document, None)
+    rule = CostGuardRule.configure(action='warn')(context)
+    with caplog.at_level(logging.WARNING):
+        walk(document, rule)
+    assert context.get_errors() == []
+    assert len(context.get_warnings()) == 2
+    assert len(caplog.records) == 2
+
+
+def test_deep_condition():
+    query = 'SELECT * FROM foo WHERE ' + \
+        ' OR '.join(['id = {}'.format(i) for i in range(2000)]) + \
+        ' LIMIT 10'
+    assert check(query) == []
+
+
+@pytest.mark.parametrize('name', ['public.foo', 'app.foo'])
+def test_qualified_table(name):
+    source_schema = create_schema(name=name)
+    document = parse('SELECT * FROM foo WHERE state = ? LIMIT 10')
+    errors = validate(source_schema, document, None, [CostGuardRule])
+    assert errors == [
+        'Full scan of table {} with about 1000000 rows, '
+        'filter by an indexed column'.format(name)
+    ]
+
+
+def test_lazy_schema_table():
+    async def loader(names):
+        table = schema.Table(names[0], rows=1000000)
+        table.add_column(schema.Column('id', schema.Type('int4')))
+        return [table]
+
+    lazy_schema = schema.LazySourceSchema(
+        'default', ['public.foo', 'app.bar'], loader
+    )
+    for query, name in [('SELECT * FROM foo', 'public.foo'),
+                        ('SELECT * FROM bar', 'app.bar')]:
+        document = parse(query)
+        assert validate(lazy_schema, document, None, [CostGuardRule]) == []
+        assert lazy_schema.missing_tables(document) == [name]
+        asyncio.run(lazy_schema.load_tables([name]))
+        assert lazy_schema.missing_tables(document) == []
+        errors = validate(lazy_schema, document, None, [CostGuardRule])
+        assert len(errors) == 2
+
+
+def test_ambiguous_table():
+    source_schema = create_schema(name='app.foo')
+    source_schema.add_table(schema.Table('audit.foo', rows=1000000))
+    document = parse('SELECT * FROM foo')
+    assert validate(source_schema, document, None, [CostGuardRule]) == []
+
+
+def test_without_schema():
+    document = parse('SELECT * FROM foo')
+    assert validate(None, document, None, [CostGuardRule]) == []
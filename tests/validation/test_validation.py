@@ -0,0 +1,58 @@
+from mql.common import schema
+from mql.common.cache import LRUCache
+from mql.parser.parser import parse
+from mql.validation import validate
+from mql.validation.rules import CostGuardRule, SelectUniqueResultsRule
+
+
+class CountingRule(SelectUniqueResultsRule):
+    documents = 0
+
+    def visit_SelectStatement(self, node, *args):
+        CountingRule.documents += 1
+
+
+def check(query, source_schema=None, params=None, cache=None,
+          rules=(CountingRule, )):
+    return validate(source_schema, parse(query), params, list(rules), cache)
+
+
+def test_cache_valid():
+    cache = LRUCache()
+    CountingRule.documents = 0
+    assert check('SELECT a FROM foo WHERE id = 1', cache=cache) == []
+    assert check('select a  FROM foo WHERE id = 1', cache=cache) == []
+    assert CountingRule.documents == 1
+    assert cache.info().hits == 1
+
+
+def test_cache_errors():
+    cache = LRUCache()
+    CountingRule.documents = 0
+    errors = check('SELECT a, a FROM foo', cache=cache)
+    assert len(errors) == 1
+    errors.append('changed')
+    assert check('SELECT a, a FROM foo', cache=cache) == errors[:1]
+    assert CountingRule.documents == 1
+
+
+def test_cache_key():
+    cache = LRUCache()
+    first = schema.SourceSchema('default')
+    CountingRule.documents = 0
+    check('SELECT a FROM foo WHERE id = ?', first, [1], cache)
+    check('SELECT a FROM foo WHERE id = ?', first, ['1'], cache)
+    check('SELECT a FROM foo WHERE id = 2', first, None, cache)
+    check('SELECT a FROM foo WHERE id = ?', schema.SourceSchema('default'),
+          [1], cache)
+    check('SELECT a FROM foo WHERE id = ?', first, [1], cache,
+          [CountingRule, CostGuardRule])
+    assert CountingRule.documents == 5
+    assert cache.info().hits == 0
+
+
+def test_without_cache():
+    CountingRule.documents = 0
+    check('SELECT a FROM foo')
+    check('SELECT a FROM foo')
+    assert CountingRule.documents == 2